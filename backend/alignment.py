@@ -0,0 +1,129 @@
+"""Aligned, columnar sentence manifests for the dual-language player.
+
+The player used to fetch every ``<LANG>-<title>.json`` separately and pair the
+rows by ``n`` in the browser, while each row repeated ``file``, ``lang`` and
+``datetime``. The manifest holds one ``n`` column for the whole title plus, per
+language, a ``text`` and a ``file`` column aligned to it. A language that lacks
+a sentence has ``null`` at that position. Manifests are serialized once and
+then reused until the catalog or one of the sentence lists changes.
+"""
+from __future__ import annotations
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .catalog import CatalogConfigError, CatalogIndex, hashed_name, media_root, sentence_file
+from .payloads import EncodedPayload, encode_json_payload
+
+MANIFEST_VERSION = 1
+_LANG_KEY_RE = re.compile(r"^([A-Za-z]{2,3})-.+\.json$")
+_CACHE_SIZE = 256
+
+_cache_lock = threading.Lock()
+# (catalog signature, title, langs) -> (sentence list signature, payload)
+_cache: "OrderedDict[Tuple[Any, str, Tuple[str, ...]], Tuple[Tuple[Tuple[int, int], ...], EncodedPayload]]" = OrderedDict()
+
+
+def title_languages(title: Dict[str, Any]) -> List[str]:
+    """Languages declared by ``"<LANG>-....json": "file"`` keys, read the way the player does."""
+
+    langs: List[str] = []
+    for key, value in title.items():
+        match = _LANG_KEY_RE.match(key) if value == "file" else None
+        if match and match.group(1).upper() not in langs:
+            langs.append(match.group(1).upper())
+    return langs
+
+
+def _list_path(title_dir: Path, title_id: str, lang: str) -> Path:
+    return title_dir / f"{lang}-{title_id}.json"
+
+
+def _lists_signature(paths: Sequence[Path]) -> Tuple[Tuple[int, int], ...]:
+    signature = []
+    for path in paths:
+        stat = path.stat()
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def build_aligned_manifest(
+    title_id: str, langs: Sequence[str], assets: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Columns of ``langs``; ``assets`` (fingerprints of the title) adds a ``hashed`` column."""
+
+    title_dir = media_root() / title_id
+    rows: Dict[str, Dict[int, Dict[str, Any]]] = {}
+    for lang in langs:
+        with _list_path(title_dir, title_id, lang).open("r", encoding="utf-8") as fh:
+            entries = json.load(fh)
+        rows[lang] = {
+            int(entry["n"]): entry for entry in entries if isinstance(entry, dict) and "n" in entry
+        }
+    numbers = sorted({n for by_n in rows.values() for n in by_n})
+    files = {lang: [rows[lang].get(n, {}).get("file") for n in numbers] for lang in langs}
+    manifest: Dict[str, Any] = {
+        "version": MANIFEST_VERSION,
+        "title_id": title_id,
+        "langs": list(langs),
+        "n": numbers,
+        "text": {lang: [rows[lang].get(n, {}).get("text") for n in numbers] for lang in langs},
+        "file": files,
+    }
+    if assets:
+        manifest["hashed"] = {lang: [_hashed(assets, file) for file in files[lang]] for lang in langs}
+    return manifest
+
+
+def _hashed(assets: Dict[str, Dict[str, Any]], file: Optional[str]) -> Optional[str]:
+    relative = sentence_file(file)
+    entry = assets.get(relative)
+    return hashed_name(relative, entry["hash"]) if entry else None
+
+
+def get_aligned_payload(index: CatalogIndex, title_id: str, langs: Sequence[str]) -> EncodedPayload:
+    """Serialized manifest of ``langs`` (already validated) for ``title_id``, cached.
+
+    Raises ``FileNotFoundError`` when a sentence list is missing on disk.
+    """
+
+    title_dir = media_root() / title_id
+    files_signature = _lists_signature([_list_path(title_dir, title_id, lang) for lang in langs])
+    key = (index.signature, title_id, tuple(langs))
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == files_signature:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    try:
+        payload = encode_json_payload(
+            build_aligned_manifest(title_id, langs, index.assets.get(title_id))
+        )
+    except (ValueError, KeyError, TypeError) as exc:
+        raise CatalogConfigError(f"Invalid sentence list for {title_id}: {exc}") from exc
+    with _cache_lock:
+        _cache[key] = (files_signature, payload)
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return payload
+
+
+def requested_languages(title: Dict[str, Any], langs: Optional[str]) -> Tuple[List[str], List[str]]:
+    """Split ``langs=CA,EN`` into (known languages, unknown ones); no value means every language."""
+
+    available = title_languages(title)
+    if not langs:
+        return available, []
+    wanted: List[str] = []
+    for lang in (part.strip().upper() for part in langs.split(",")):
+        if lang and lang not in wanted:
+            wanted.append(lang)
+    return [lang for lang in wanted if lang in available], [
+        lang for lang in wanted if lang not in available
+    ]
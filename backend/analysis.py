@@ -0,0 +1,303 @@
+"""NumPy analysis of the sentence WAVs: exact durations, loudness, silence bounds, peaks.
+
+Every WAV is memory-mapped (no decoding, no full read into Python objects)
+and analysed in a worker process. Results are cached in
+``catalog/audio-analysis.json`` keyed by the file's SHA-256 and the analysis
+parameters, so re-runs only touch new or changed audio.
+
+The results are written back into each ``<LANG>-<title>.json`` sentence entry
+(``duration_ms``, ``trim_ms``, ``rms_db``, ``peaks``). Per-title totals go into
+the analysis file, where the catalog picks them up to replace the hand-typed
+``duration``. ``manage.py build-bundles`` honours ``trim_ms``, so bundles
+leave out leading and trailing silence.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .catalog import ANALYSIS_PATH, get_catalog_index, media_root, sentence_file
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np
+except ImportError:  # pragma: no cover - only needed by manage.py analyze-audio
+    np = None
+
+
+ANALYSIS_VERSION = 1
+_DTYPES = {(1, 1): "u1", (1, 2): "<i2", (1, 4): "<i4", (3, 4): "<f4"}
+
+
+class AnalysisError(RuntimeError):
+    """Raised when audio cannot be analysed."""
+
+
+@dataclass(frozen=True)
+class AnalysisParams:
+    peaks: int = 48
+    silence_db: float = -45.0
+    window_ms: int = 10
+    pad_ms: int = 60
+
+    def key(self) -> str:
+        return json.dumps({"v": ANALYSIS_VERSION, **asdict(self)}, sort_keys=True)
+
+
+@dataclass
+class AnalysisReport:
+    analysed: int = 0
+    cached: int = 0
+    failed: List[str] = field(default_factory=list)
+    trimmed_ms: int = 0
+
+    def summary(self) -> str:
+        lines = [
+            f"analysed={self.analysed} cached={self.cached} failed={len(self.failed)} "
+            f"silence trimmed={self.trimmed_ms / 1000:.1f}s"
+        ]
+        lines.extend(f"  failed: {item}" for item in self.failed)
+        return "\n".join(lines)
+
+
+def _wav_layout(path: Path) -> Tuple[int, int, int, int, int, int]:
+    """Return (format, channels, rate, sample_width, data_offset, data_size) of a WAV."""
+
+    with path.open("rb") as fh:
+        riff, _, wave_id = struct.unpack("<4sI4s", fh.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise AnalysisError("not a RIFF/WAVE file")
+        fmt: Optional[Tuple[int, int, int, int]] = None
+        while True:
+            header = fh.read(8)
+            if len(header) < 8:
+                raise AnalysisError("missing data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                raw = fh.read(size)
+                audio_format, channels, rate, _, _, bits = struct.unpack("<HHIIHH", raw[:16])
+                if audio_format == 0xFFFE and size >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                    audio_format = struct.unpack("<H", raw[24:26])[0]
+                fmt = (audio_format, channels, rate, bits // 8)
+                if size % 2:
+                    fh.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise AnalysisError("data chunk before fmt chunk")
+                return (*fmt, fh.tell(), size)
+            else:
+                fh.seek(size + size % 2, os.SEEK_CUR)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def analyse_wav(path: Path, params: AnalysisParams) -> Dict[str, Any]:
+    """Duration, RMS (dBFS), trim bounds (ms) and ``params.peaks`` 0-255 peak levels."""
+
+    if np is None:
+        raise AnalysisError("numpy is required for audio analysis (pip install numpy)")
+    audio_format, channels, rate, width, offset, size = _wav_layout(path)
+    dtype = _DTYPES.get((audio_format, width))
+    if dtype is None or channels < 1 or rate < 1:
+        raise AnalysisError(f"unsupported WAV encoding (format={audio_format}, {width * 8} bit)")
+
+    frames = size // (channels * width)
+    if frames == 0:
+        return {"duration_ms": 0, "trim_ms": [0, 0], "rms_db": None, "peaks": [0] * params.peaks}
+    raw = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+    if dtype == "u1":
+        samples = (raw.astype(np.float32) - 128.0) / 128.0
+    elif dtype == "<f4":
+        samples = np.asarray(raw, dtype=np.float32)
+    else:
+        samples = raw.astype(np.float32) / float(2 ** (width * 8 - 1))
+    level = np.abs(samples).max(axis=1)
+
+    mean_square = float(np.mean(np.square(samples, dtype=np.float64)))
+    rms_db = round(10 * np.log10(mean_square), 1) if mean_square > 0 else None
+
+    window = max(1, rate * params.window_ms // 1000)
+    padded = np.pad(level, (0, (-frames) % window))
+    envelope = padded.reshape(-1, window).max(axis=1)
+    loud = np.flatnonzero(envelope >= 10 ** (params.silence_db / 20))
+    if loud.size:
+        pad = rate * params.pad_ms // 1000
+        start = max(0, int(loud[0]) * window - pad)
+        end = min(frames, (int(loud[-1]) + 1) * window + pad)
+    else:
+        start = end = 0
+
+    buckets = np.array_split(level, params.peaks)
+    peaks = [int(round(float(bucket.max()) * 255)) if bucket.size else 0 for bucket in buckets]
+
+    return {
+        "duration_ms": round(frames * 1000 / rate),
+        "trim_ms": [round(start * 1000 / rate), round(end * 1000 / rate)],
+        "rms_db": rms_db,
+        "peaks": [min(255, peak) for peak in peaks],
+    }
+
+
+_worker_cache: Dict[str, Any] = {}
+_worker_params = AnalysisParams()
+
+
+def _init_worker(cache: Dict[str, Any], params: AnalysisParams) -> None:
+    global _worker_cache, _worker_params
+    _worker_cache, _worker_params = cache, params
+
+
+def _run_job(path_str: str) -> Tuple[str, str, Any, bool]:
+    """Hash one file and analyse it unless the cache already has its hash; worker process."""
+
+    path = Path(path_str)
+    try:
+        sha256 = _sha256(path)
+        if sha256 in _worker_cache:
+            return path_str, sha256, _worker_cache[sha256], False
+        return path_str, sha256, analyse_wav(path, _worker_params), True
+    except (AnalysisError, OSError, ValueError, struct.error) as exc:
+        return path_str, "", str(exc), False
+
+
+def _load_cache(path: Path, params: AnalysisParams) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    if data.get("params") != params.key():
+        return {}
+    return data.get("files", {})
+
+
+def _write_json(path: Path, data: Any, **dump_kwargs: Any) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, **dump_kwargs)
+        fh.write("\n")
+    os.replace(tmp, path)
+
+
+def _write_sentence_list(path: Path, entries: List[Dict[str, Any]]) -> None:
+    """One sentence per line keeps the file readable without spreading ``peaks`` over 48 lines."""
+
+    tmp = path.with_name(f".{path.name}.tmp")
+    lines = ",\n".join("    " + json.dumps(entry, ensure_ascii=False) for entry in entries)
+    tmp.write_text(f"[\n{lines}\n]\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _sentence_lists(title_dir: Path, title_id: str) -> Dict[str, Path]:
+    return {
+        path.name[: -len(f"-{title_id}.json")]: path
+        for path in sorted(title_dir.glob(f"*-{title_id}.json"))
+    }
+
+
+def analyse_catalog(
+    title_ids: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+    params: AnalysisParams = AnalysisParams(),
+    cache_path: Path = ANALYSIS_PATH,
+) -> AnalysisReport:
+    """Analyse every sentence of the selected titles and update their sentence JSON."""
+
+    if np is None:
+        raise AnalysisError("numpy is required for audio analysis (pip install numpy)")
+    catalog_titles = get_catalog_index().titles
+    selected = list(title_ids) if title_ids else list(catalog_titles)
+    unknown = [title_id for title_id in selected if title_id not in catalog_titles]
+    if unknown:
+        raise AnalysisError(f"Unknown titles: {', '.join(unknown)}")
+
+    root = media_root()
+    cache = _load_cache(cache_path, params)
+    # title -> lang -> (sentence JSON path, entries)
+    sentence_lists: Dict[str, Dict[str, Tuple[Path, List[Dict[str, Any]]]]] = {}
+    files: List[str] = []
+    for title_id in selected:
+        title_dir = root / title_id
+        if not title_dir.is_dir():
+            continue
+        for lang, list_path in _sentence_lists(title_dir, title_id).items():
+            with list_path.open("r", encoding="utf-8") as fh:
+                entries = json.load(fh)
+            sentence_lists.setdefault(title_id, {})[lang] = (list_path, entries)
+            for entry in entries:
+                source = title_dir / sentence_file(entry.get("file"))
+                if entry.get("file") and source.exists():
+                    files.append(str(source))
+
+    report = AnalysisReport()
+    results: Dict[str, Dict[str, Any]] = {}
+    fresh_cache: Dict[str, Any] = {}
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        initializer=_init_worker,
+        initargs=(cache, params),
+    ) as pool:
+        for path, sha256, result, analysed in pool.map(
+            _run_job, list(dict.fromkeys(files)), chunksize=8
+        ):
+            if not sha256:
+                report.failed.append(f"{Path(path).relative_to(root)}: {result}")
+                continue
+            results[path] = result
+            fresh_cache[sha256] = result
+            report.analysed += int(analysed)
+            report.cached += int(not analysed)
+            trim_start, trim_end = result["trim_ms"]
+            report.trimmed_ms += result["duration_ms"] - (trim_end - trim_start)
+
+    title_summaries: Dict[str, Any] = {}
+    for title_id, langs in sentence_lists.items():
+        title_dir = root / title_id
+        lang_totals: Dict[str, int] = {}
+        for lang, (list_path, entries) in langs.items():
+            changed = False
+            total = 0
+            for entry in entries:
+                source = str(title_dir / sentence_file(entry.get("file")))
+                result = results.get(source)
+                if result is None:
+                    continue
+                total += result["duration_ms"]
+                if any(entry.get(key) != value for key, value in result.items()):
+                    entry.update(result)
+                    changed = True
+            if changed:
+                _write_sentence_list(list_path, entries)
+            lang_totals[lang] = total
+        if lang_totals:
+            title_summaries[title_id] = {
+                "duration_ms": max(lang_totals.values()),
+                "langs": lang_totals,
+            }
+
+    previous_titles: Dict[str, Any] = {}
+    if cache_path.exists():
+        with cache_path.open("r", encoding="utf-8") as fh:
+            previous_titles = json.load(fh).get("titles", {})
+    # A full run drops hashes of audio that no longer exists; partial runs keep them.
+    kept_cache = cache if title_ids else {}
+    _write_json(
+        cache_path,
+        {
+            "params": params.key(),
+            "titles": {**previous_titles, **title_summaries},
+            "files": {**kept_cache, **fresh_cache},
+        },
+        separators=(",", ":"),
+    )
+    return report
@@ -1,19 +1,49 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .database import Base, engine
-from .routers import auth, catalog, paypal_webhooks
+from .catalog import enable_version_tracking
+from .database import Base, engine, group_commit_enabled, group_commit_writer, upgrade_schema
+from .email_utils import email_outbox
+from .maintenance import maintenance_scheduler
+from .payloads import DefaultJSONResponse
+from .routers import auth, catalog, media, paypal_webhooks
 from .settings import get_settings
 
 logging.basicConfig(level=logging.INFO)
 
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 settings = get_settings()
 
-app = FastAPI(title="Audiovook Magic Link API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    enable_version_tracking()
+    email_outbox.start()
+    await paypal_webhooks.ipn_processor.start()
+    maintenance_scheduler.start()
+    if group_commit_enabled():
+        group_commit_writer.start()
+    try:
+        yield
+    finally:
+        group_commit_writer.stop()
+        await maintenance_scheduler.stop()
+        await paypal_webhooks.ipn_processor.stop()
+        # Draining the outbox joins its SMTP threads; keep that off the event loop.
+        await asyncio.to_thread(email_outbox.stop)
+
+
+app = FastAPI(
+    title="Audiovook Magic Link API",
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,4 +55,5 @@ app.add_middleware(
 
 app.include_router(auth.router)
 app.include_router(catalog.router)
+app.include_router(media.router)
 app.include_router(paypal_webhooks.router)
@@ -0,0 +1,293 @@
+"""Micro-benchmarks behind the tuning defaults documented in the README."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from .database import sqlite_pragmas
+from .models import User, UserPackage
+from .payloads import DefaultJSONResponse
+from .schemas import MagicLoginResponse, UserRead, magic_login_payload, user_payload
+
+# journal_mode=DELETE / synchronous=FULL are SQLite's out-of-the-box behavior.
+DEFAULT_PRAGMAS = ["PRAGMA journal_mode=DELETE", "PRAGMA synchronous=FULL"]
+
+_SCHEMA = """
+CREATE TABLE magic_link_tokens (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    token_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL
+);
+CREATE INDEX ix_magic_link_tokens_token_hash ON magic_link_tokens (token_hash);
+"""
+
+
+@dataclass
+class SQLiteBenchResult:
+    label: str
+    reads: int
+    writes: int
+    read_errors: int
+    seconds: float
+    write_latencies: List[float]
+
+    @property
+    def reads_per_second(self) -> float:
+        return self.reads / self.seconds
+
+    @property
+    def writes_per_second(self) -> float:
+        return self.writes / self.seconds
+
+    def write_p95_ms(self) -> float:
+        if len(self.write_latencies) < 2:
+            return 0.0
+        return statistics.quantiles(self.write_latencies, n=20)[-1] * 1000
+
+    def summary(self) -> str:
+        return (
+            f"{self.label:<8} reads/s={self.reads_per_second:>9.0f}  "
+            f"writes/s={self.writes_per_second:>7.0f}  "
+            f"write p95={self.write_p95_ms():>7.2f} ms  locked reads={self.read_errors}"
+        )
+
+
+def _connect(path: Path, pragmas: Sequence[str]) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+def _seed(path: Path, pragmas: Sequence[str], rows: int) -> None:
+    conn = _connect(path, pragmas)
+    conn.executescript(_SCHEMA)
+    now = time.time()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO magic_link_tokens (user_id, token_hash, created_at) VALUES (?, ?, ?)",
+        (
+            (i % 500, hashlib.sha256(str(i).encode()).hexdigest(), now - i)
+            for i in range(rows)
+        ),
+    )
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def _run(
+    label: str, pragmas: Sequence[str], readers: int, seconds: float, rows: int
+) -> SQLiteBenchResult:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        _seed(path, pragmas, rows)
+        stop = threading.Event()
+        counts = {"reads": 0, "errors": 0}
+        counts_lock = threading.Lock()
+        latencies: List[float] = []
+
+        def reader(offset: int) -> None:
+            conn = _connect(path, pragmas)
+            reads = errors = 0
+            i = offset
+            while not stop.is_set():
+                token_hash = hashlib.sha256(str(i % rows).encode()).hexdigest()
+                try:
+                    conn.execute(
+                        "SELECT id, used_at FROM magic_link_tokens WHERE token_hash = ?",
+                        (token_hash,),
+                    ).fetchone()
+                    reads += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+                i += 7
+            conn.close()
+            with counts_lock:
+                counts["reads"] += reads
+                counts["errors"] += errors
+
+        def writer() -> None:
+            conn = _connect(path, pragmas)
+            i = rows
+            while not stop.is_set():
+                started = time.perf_counter()
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT INTO magic_link_tokens (user_id, token_hash, created_at) VALUES (?, ?, ?)",
+                    (i % 500, hashlib.sha256(str(i).encode()).hexdigest(), time.time()),
+                )
+                conn.execute(
+                    "UPDATE magic_link_tokens SET used_at = ? WHERE id = ?",
+                    (time.time(), i % rows + 1),
+                )
+                conn.execute("COMMIT")
+                latencies.append(time.perf_counter() - started)
+                i += 1
+            conn.close()
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    return SQLiteBenchResult(
+        label=label,
+        reads=counts["reads"],
+        writes=len(latencies),
+        read_errors=counts["errors"],
+        seconds=elapsed,
+        write_latencies=latencies,
+    )
+
+
+def run_sqlite_benchmark(
+    readers: int = 4, seconds: float = 5.0, rows: int = 20000, pragmas: Optional[Sequence[str]] = None
+) -> List[SQLiteBenchResult]:
+    """Token lookups from ``readers`` threads while one writer inserts and marks tokens used.
+
+    Runs once with SQLite's default journal settings and once with the pragmas
+    the backend applies (``database.sqlite_pragmas``).
+    """
+
+    return [
+        _run("default", DEFAULT_PRAGMAS, readers, seconds, rows),
+        _run("tuned", list(pragmas or sqlite_pragmas()), readers, seconds, rows),
+    ]
+
+
+@dataclass
+class SerializationBenchResult:
+    label: str
+    requests: int
+    cpu_seconds: float
+    body_bytes: int
+
+    @property
+    def cpu_us_per_request(self) -> float:
+        return self.cpu_seconds / self.requests * 1_000_000
+
+    def summary(self) -> str:
+        return (
+            f"{self.label:<24} cpu/request={self.cpu_us_per_request:>7.1f} us  "
+            f"body={self.body_bytes} B"
+        )
+
+
+def _bench_user(packages: int) -> User:
+    user = User(id=42, email="reader@example.com", full_access=False, is_active=True)
+    user.package_links = [UserPackage(package_id=f"pkg-{n}") for n in range(packages)]
+    return user
+
+
+def _serialization_app(user: User, access_token: str) -> FastAPI:
+    """``/auth/me`` and ``/auth/magic-login`` responses, served the old and the new way."""
+
+    app = FastAPI(default_response_class=JSONResponse)
+
+    @app.get("/before/me", response_model=UserRead)
+    async def me_before() -> User:
+        return user
+
+    @app.get("/before/magic-login", response_model=MagicLoginResponse)
+    async def login_before() -> MagicLoginResponse:
+        return MagicLoginResponse(access_token=access_token, token_type="bearer", user=user)
+
+    @app.get("/after/me", response_model=UserRead)
+    async def me_after() -> DefaultJSONResponse:
+        return DefaultJSONResponse(user_payload(user))
+
+    @app.get("/after/magic-login", response_model=MagicLoginResponse)
+    async def login_after() -> DefaultJSONResponse:
+        return DefaultJSONResponse(magic_login_payload(access_token, user))
+
+    return app
+
+
+async def _drive(app: FastAPI, path: str, requests: int) -> Dict[str, Any]:
+    """Call the ASGI app ``requests`` times in-process, with no socket or HTTP client in the way."""
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    last: Dict[str, Any] = {}
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            last["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            last["body"] = message.get("body", b"")
+
+    for _ in range(requests):
+        await app(scope, receive, send)
+    return last
+
+
+def run_serialization_benchmark(
+    requests: int = 5000, packages: int = 20
+) -> List[SerializationBenchResult]:
+    """Per-request CPU of ``/auth/me`` and ``/auth/magic-login`` before and after the orjson switch.
+
+    "before" returns the ORM user through the ``response_model`` (pydantic
+    validation, ``jsonable_encoder``, ``JSONResponse``); "after" returns an
+    ``ORJSONResponse`` of the slim dict, as the routes now do.
+    """
+
+    user = _bench_user(packages)
+    app = _serialization_app(user, access_token="x" * 220)
+    results: List[SerializationBenchResult] = []
+
+    async def measure(label: str, path: str) -> None:
+        warm = await _drive(app, path, 50)
+        if warm.get("status") != 200:
+            raise RuntimeError(f"{path} answered {warm.get('status')}")
+        started = time.process_time()
+        last = await _drive(app, path, requests)
+        results.append(
+            SerializationBenchResult(
+                label=label,
+                requests=requests,
+                cpu_seconds=time.process_time() - started,
+                body_bytes=len(last["body"]),
+            )
+        )
+
+    async def run_all() -> None:
+        for route in ("me", "magic-login"):
+            await measure(f"/auth/{route} before", f"/before/{route}")
+            await measure(f"/auth/{route} after", f"/after/{route}")
+
+    asyncio.run(run_all())
+    return results
@@ -0,0 +1,211 @@
+"""One WAV per title and language, plus a sentence offset table for the player.
+
+``<title>/<LANG>/bundle.wav`` holds every sentence of ``<LANG>-<title>.json``
+back to back. ``<LANG>-<title>.offsets.json`` sits next to the sentence list.
+It stores the PCM format plus four parallel columns: sentence ``n``, the byte
+``offset`` of its samples inside the bundle, their ``length`` in bytes, and
+``duration_ms``. Sentences analysed by ``manage.py analyze-audio`` are cut to
+their ``trim_ms`` bounds. The player downloads the bundle once and slices sentences
+out of it, so a title costs one audio request per language instead of one
+per sentence.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .catalog import get_catalog_index, media_root, sentence_file
+
+BUNDLE_NAME = "bundle.wav"
+OFFSETS_VERSION = 1
+_COPY_FRAMES = 1 << 16
+
+
+class BundleError(RuntimeError):
+    """Raised when a language's sentences cannot be concatenated."""
+
+
+class _Sentence(NamedTuple):
+    n: int
+    path: Path
+    trim_ms: Optional[Tuple[int, int]] = None
+
+
+@dataclass(frozen=True)
+class BundleResult:
+    title_id: str
+    lang: str
+    sentences: int
+    bytes: int
+    rebuilt: bool
+
+
+def offsets_path(title_dir: Path, title_id: str, lang: str) -> Path:
+    return title_dir / f"{lang}-{title_id}.offsets.json"
+
+
+def _sentence_files(title_dir: Path, title_id: str, lang: str) -> List[_Sentence]:
+    """Sentences in playback order, from ``<LANG>-<title>.json`` when it exists.
+
+    ``trim_ms`` comes from ``manage.py analyze-audio`` and marks the audible part.
+    """
+
+    index_path = title_dir / f"{lang}-{title_id}.json"
+    if index_path.exists():
+        with index_path.open("r", encoding="utf-8") as fh:
+            entries = json.load(fh)
+        return [
+            _Sentence(
+                int(entry["n"]),
+                title_dir / sentence_file(entry["file"]),
+                tuple(entry["trim_ms"]) if entry.get("trim_ms") else None,
+            )
+            for entry in sorted(entries, key=lambda entry: int(entry["n"]))
+            if entry.get("file")
+        ]
+    files = sorted(path for path in (title_dir / lang).glob("*.wav") if path.name != BUNDLE_NAME)
+    return [_Sentence(position, path) for position, path in enumerate(files, start=1)]
+
+
+def _signature(files: Sequence[_Sentence]) -> str:
+    digest = hashlib.sha256()
+    for n, path, trim_ms in files:
+        stat = path.stat()
+        digest.update(f"{n}:{path.name}:{stat.st_size}:{stat.st_mtime_ns}:{trim_ms};".encode())
+    return digest.hexdigest()[:32]
+
+
+def _frame_range(sentence: _Sentence, frames: int, rate: int) -> Tuple[int, int]:
+    if sentence.trim_ms is None:
+        return 0, frames
+    start_ms, end_ms = sentence.trim_ms
+    start = min(frames, max(0, start_ms * rate // 1000))
+    end = min(frames, max(start, end_ms * rate // 1000))
+    return (start, end) if end > start else (0, frames)
+
+
+def _read_params(files: Sequence[_Sentence]) -> Tuple[Any, List[int]]:
+    """Shared ``wave`` params of every sentence plus each sentence's frame count."""
+
+    params: Any = None
+    frames: List[int] = []
+    for _, path, _ in files:
+        try:
+            with wave.open(str(path), "rb") as src:
+                current = src.getparams()
+        except (wave.Error, EOFError) as exc:
+            raise BundleError(f"{path.name}: {exc}") from exc
+        if params is None:
+            params = current
+        elif current[:3] != params[:3]:
+            raise BundleError(
+                f"{path.name} is {current.nchannels}ch/{current.sampwidth * 8}bit/"
+                f"{current.framerate}Hz, expected {params.nchannels}ch/"
+                f"{params.sampwidth * 8}bit/{params.framerate}Hz"
+            )
+        frames.append(current.nframes)
+    if params is None:
+        raise BundleError("no sentences")
+    return params, frames
+
+
+def build_bundle(title_dir: Path, title_id: str, lang: str, force: bool = False) -> BundleResult:
+    files = _sentence_files(title_dir, title_id, lang)
+    missing = [sentence.path.name for sentence in files if not sentence.path.exists()]
+    if missing:
+        raise BundleError(f"missing sentence files: {', '.join(missing)}")
+
+    table_path = offsets_path(title_dir, title_id, lang)
+    bundle_path = title_dir / lang / BUNDLE_NAME
+    signature = _signature(files)
+    if not force and table_path.exists() and bundle_path.exists():
+        with table_path.open("r", encoding="utf-8") as fh:
+            existing = json.load(fh)
+        if existing.get("signature") == signature:
+            size = bundle_path.stat().st_size
+            return BundleResult(title_id, lang, len(existing["n"]), size, rebuilt=False)
+
+    params, frames = _read_params(files)
+    block_align = params.nchannels * params.sampwidth
+    ranges = [
+        _frame_range(sentence, count, params.framerate) for sentence, count in zip(files, frames)
+    ]
+    tmp = bundle_path.with_name(f".{BUNDLE_NAME}.tmp")
+    offsets: List[int] = []
+    with tmp.open("wb") as fh:
+        with wave.open(fh, "wb") as out:
+            out.setnchannels(params.nchannels)
+            out.setsampwidth(params.sampwidth)
+            out.setframerate(params.framerate)
+            out.setnframes(sum(end - start for start, end in ranges))
+            out.writeframesraw(b"")  # writes the header so the data offset is known
+            position = fh.tell()
+            for sentence, (start, end) in zip(files, ranges):
+                offsets.append(position)
+                with wave.open(str(sentence.path), "rb") as src:
+                    src.setpos(start)
+                    remaining = end - start
+                    while remaining > 0:
+                        chunk = src.readframes(min(_COPY_FRAMES, remaining))
+                        if not chunk:
+                            break
+                        out.writeframesraw(chunk)
+                        position += len(chunk)
+                        remaining -= len(chunk) // block_align
+    os.replace(tmp, bundle_path)
+
+    table: Dict[str, Any] = {
+        "version": OFFSETS_VERSION,
+        "file": f"{lang}/{BUNDLE_NAME}",
+        "signature": signature,
+        "sample_rate": params.framerate,
+        "channels": params.nchannels,
+        "sample_width": params.sampwidth,
+        "n": [sentence.n for sentence in files],
+        "offset": offsets,
+        "length": [(end - start) * block_align for start, end in ranges],
+        "duration_ms": [round((end - start) * 1000 / params.framerate) for start, end in ranges],
+    }
+    tmp_table = table_path.with_name(f".{table_path.name}.tmp")
+    with tmp_table.open("w", encoding="utf-8") as fh:
+        json.dump(table, fh, separators=(",", ":"))
+    os.replace(tmp_table, table_path)
+    return BundleResult(title_id, lang, len(files), bundle_path.stat().st_size, True)
+
+
+def _languages(title_dir: Path) -> List[str]:
+    return sorted(path.name for path in title_dir.iterdir() if path.is_dir())
+
+
+def build_bundles(
+    title_ids: Optional[Iterable[str]] = None, force: bool = False
+) -> Tuple[List[BundleResult], List[str]]:
+    """Build (or refresh) the bundles of every title that has audio on disk.
+
+    Returns the results plus one error line per language that could not be bundled.
+    """
+
+    catalog_titles = get_catalog_index().titles
+    selected = list(title_ids) if title_ids else list(catalog_titles)
+    unknown = [title_id for title_id in selected if title_id not in catalog_titles]
+    if unknown:
+        raise BundleError(f"Unknown titles: {', '.join(unknown)}")
+
+    root = media_root()
+    results: List[BundleResult] = []
+    errors: List[str] = []
+    for title_id in selected:
+        title_dir = root / title_id
+        if not title_dir.is_dir():
+            continue
+        for lang in _languages(title_dir):
+            try:
+                results.append(build_bundle(title_dir, title_id, lang, force=force))
+            except (BundleError, OSError, ValueError, KeyError) as exc:
+                errors.append(f"{title_id}/{lang}: {exc}")
+    return results, errors
@@ -2,8 +2,31 @@
 from __future__ import annotations
 
 import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .catalog_history import CatalogHistory, changed_since, record_version, title_fingerprints
+from .catalog_search import SearchIndex, build_search_index
+from .payloads import (
+    EncodedPayload,
+    compute_etag,
+    dump_json,
+    encode_json_payload,
+    encode_payload,
+)
+from .settings import get_settings
+
+try:  # pragma: no cover - optional dependency
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+logger = logging.getLogger("uvicorn.error")
 
 
 class CatalogConfigError(RuntimeError):
@@ -14,6 +37,65 @@ ROOT_DIR = Path(__file__).resolve().parents[1]
 CATALOG_DIR = ROOT_DIR / "catalog"
 TITLES_PATH = CATALOG_DIR / "titles.json"
 PACKAGES_PATH = CATALOG_DIR / "packages.json"
+RENDITIONS_PATH = CATALOG_DIR / "renditions.json"
+ANALYSIS_PATH = CATALOG_DIR / "audio-analysis.json"
+FINGERPRINTS_PATH = CATALOG_DIR / "fingerprints.json"
+COMPILED_PATH = CATALOG_DIR / "catalog.compiled.json"
+COMPILED_FORMAT = 2
+SOURCE_PATHS = (TITLES_PATH, PACKAGES_PATH, RENDITIONS_PATH, ANALYSIS_PATH, FINGERPRINTS_PATH)
+AUDIOS_DIR = ROOT_DIR / "AUDIOS"
+
+FileSignature = Tuple[Tuple[int, int], ...]
+# Serialized responses kept per snapshot; library and changes keys vary per caller.
+_PAYLOAD_CACHE_SIZE = 256
+
+
+class _PayloadCache:
+    """Thread-safe LRU of the serialized responses built from one snapshot."""
+
+    def __init__(self, size: int = _PAYLOAD_CACHE_SIZE) -> None:
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, EncodedPayload]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[EncodedPayload]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def put(self, key: str, payload: EncodedPayload) -> None:
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@dataclass(frozen=True)
+class CatalogIndex:
+    """Parsed catalog snapshot; treat every container as read-only."""
+
+    signature: FileSignature
+    path_audios: str
+    titles: Dict[str, Dict[str, Any]]
+    packages: Tuple[Dict[str, Any], ...]
+    packages_by_id: Dict[str, Dict[str, Any]]
+    package_ids: FrozenSet[str]
+    free_package: Optional[Dict[str, Any]]
+    title_packages: Dict[str, FrozenSet[str]]
+    free_title_ids: FrozenSet[str]
+    rendition_formats: Dict[str, Dict[str, Any]]
+    title_renditions: Dict[str, Dict[str, List[str]]]
+    assets: Dict[str, Dict[str, Dict[str, Any]]]
+    search: SearchIndex
+    version: int
+    history: CatalogHistory
+    payloads: _PayloadCache = field(default_factory=_PayloadCache, compare=False, repr=False)
 
 
 def _load_json(path: Path) -> Any:
@@ -22,39 +104,320 @@ def _load_json(path: Path) -> Any:
             return json.load(fh)
     except FileNotFoundError as exc:  # pragma: no cover - validated at runtime
         raise CatalogConfigError(f"Missing catalog file: {path.name}") from exc
+    except json.JSONDecodeError as exc:
+        raise CatalogConfigError(f"Invalid JSON in {path.name}: {exc}") from exc
 
 
-def get_titles() -> tuple[str, Dict[str, Dict[str, Any]]]:
-    """Return the audio base path plus title metadata keyed by ID."""
+def _file_signature(paths: Iterable[Path]) -> FileSignature:
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            signature.append((-1, -1))
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
 
-    data = _load_json(TITLES_PATH)
-    titles = data.get("titles") or data.get("AUDIOS")
+
+def _parse_titles(data: Any) -> tuple[str, Dict[str, Dict[str, Any]]]:
+    titles = data.get("titles") or data.get("AUDIOS") if isinstance(data, dict) else None
     if not isinstance(titles, dict):
         raise CatalogConfigError("Invalid titles.json: missing 'titles' map")
     path = data.get("path_audios") or data.get("PATH_AUDIOS") or "/AUDIOS/"
     return path, titles
 
 
-def get_packages() -> List[Dict[str, Any]]:
-    data = _load_json(PACKAGES_PATH)
-    packages = data.get("packages")
+def _parse_packages(data: Any) -> List[Dict[str, Any]]:
+    packages = data.get("packages") if isinstance(data, dict) else None
     if not isinstance(packages, list):
         raise CatalogConfigError("Invalid packages.json: missing 'packages' list")
     return packages
 
 
+def _parse_renditions(
+    data: Any,
+) -> tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, List[str]]]]:
+    """Formats plus, per title and language, the formats every segment is available in."""
+
+    if not isinstance(data, dict):
+        raise CatalogConfigError("Invalid renditions.json: expected an object")
+    formats = data.get("formats") or {}
+    title_renditions: Dict[str, Dict[str, List[str]]] = {}
+    for title_id, segments in (data.get("titles") or {}).items():
+        by_lang: Dict[str, set] = {}
+        for relative, entry in segments.items():
+            lang = relative.split("/", 1)[0]
+            available = {name for name in formats if name in entry}
+            by_lang[lang] = by_lang[lang] & available if lang in by_lang else available
+        complete = {
+            lang: [name for name in formats if name in names] for lang, names in by_lang.items()
+        }
+        complete = {lang: names for lang, names in complete.items() if names}
+        if complete:
+            title_renditions[title_id] = complete
+    return formats, title_renditions
+
+
+def _apply_analysis(titles: Dict[str, Dict[str, Any]], data: Any) -> Dict[str, Dict[str, Any]]:
+    """Replace hand-typed durations with the measured ones from ``manage.py analyze-audio``."""
+
+    measured = data.get("titles") if isinstance(data, dict) else None
+    if not isinstance(measured, dict):
+        raise CatalogConfigError("Invalid audio-analysis.json: missing 'titles' map")
+    merged = dict(titles)
+    for title_id, summary in measured.items():
+        if title_id not in merged or not isinstance(summary, dict):
+            continue
+        duration_ms = int(summary.get("duration_ms") or 0)
+        seconds = round(duration_ms / 1000)
+        merged[title_id] = {
+            **merged[title_id],
+            "duration": f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}",
+            "duration_ms": duration_ms,
+        }
+    return merged
+
+
+def _parse_fingerprints(data: Any) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    titles = data.get("titles") if isinstance(data, dict) else None
+    if not isinstance(titles, dict):
+        raise CatalogConfigError("Invalid fingerprints.json: missing 'titles' map")
+    return titles
+
+
+def sentence_file(file: Any) -> str:
+    """``./CA/0001.wav`` -> ``CA/0001.wav``: a sentence list ``file`` relative to its title directory."""
+
+    return str(file or "").removeprefix("./")
+
+
+def hashed_name(relative: str, digest: str) -> str:
+    """``CA/0001.wav`` -> ``CA/0001.<digest>.wav``: the content-addressed name of an asset."""
+
+    head, _, name = relative.rpartition("/")
+    stem, dot, suffix = name.rpartition(".")
+    hashed = f"{stem}.{digest}.{suffix}" if dot else f"{name}.{digest}"
+    return f"{head}/{hashed}" if head else hashed
+
+
+def read_catalog_sources() -> Dict[str, Any]:
+    """Parse the catalog JSON sources into the structure ``compile-catalog`` stores."""
+
+    path, titles = _parse_titles(_load_json(TITLES_PATH))
+    if ANALYSIS_PATH.exists():
+        titles = _apply_analysis(titles, _load_json(ANALYSIS_PATH))
+    rendition_formats: Dict[str, Dict[str, Any]] = {}
+    title_renditions: Dict[str, Dict[str, List[str]]] = {}
+    if RENDITIONS_PATH.exists():
+        rendition_formats, title_renditions = _parse_renditions(_load_json(RENDITIONS_PATH))
+    assets: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    if FINGERPRINTS_PATH.exists():
+        assets = _parse_fingerprints(_load_json(FINGERPRINTS_PATH))
+    return {
+        "path_audios": path,
+        "titles": titles,
+        "packages": _parse_packages(_load_json(PACKAGES_PATH)),
+        "rendition_formats": rendition_formats,
+        "title_renditions": title_renditions,
+        "assets": assets,
+    }
+
+
+def _load_compiled() -> Optional[Dict[str, Any]]:
+    """Return the compiled catalog unless it is missing or older than its sources."""
+
+    try:
+        compiled_at = COMPILED_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    newest_source = max(
+        (path.stat().st_mtime_ns for path in SOURCE_PATHS if path.exists()), default=0
+    )
+    if newest_source > compiled_at:
+        logger.warning(
+            "%s is older than the catalog sources; reading the sources instead "
+            "(run manage.py compile-catalog)",
+            COMPILED_PATH.name,
+        )
+        return None
+    raw = COMPILED_PATH.read_bytes()
+    try:
+        artifact = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except ValueError as exc:
+        raise CatalogConfigError(f"Invalid JSON in {COMPILED_PATH.name}: {exc}") from exc
+    if not isinstance(artifact, dict) or artifact.get("format") != COMPILED_FORMAT:
+        logger.warning("Ignoring %s with an unknown format", COMPILED_PATH.name)
+        return None
+    return artifact["catalog"]
+
+
+def _build_index(signature: FileSignature) -> CatalogIndex:
+    data = _load_compiled() or read_catalog_sources()
+    path = data["path_audios"]
+    titles = data["titles"]
+    packages = data["packages"]
+    rendition_formats = data["rendition_formats"]
+    title_renditions = data["title_renditions"]
+
+    packages_by_id: Dict[str, Dict[str, Any]] = {}
+    free_package: Optional[Dict[str, Any]] = None
+    for package in packages:
+        package_id = package.get("id")
+        if package_id and package_id not in packages_by_id:
+            packages_by_id[package_id] = package
+        if free_package is None and package.get("is_free"):
+            free_package = package
+
+    title_packages: Dict[str, set] = {}
+    for package_id, package in packages_by_id.items():
+        for title_id in package.get("title_ids", []):
+            title_packages.setdefault(title_id, set()).add(package_id)
+    free_title_ids = frozenset(free_package.get("title_ids", [])) if free_package else frozenset()
+
+    return CatalogIndex(
+        signature=signature,
+        path_audios=path,
+        titles=titles,
+        packages=tuple(packages),
+        packages_by_id=packages_by_id,
+        package_ids=frozenset(packages_by_id),
+        free_package=free_package,
+        title_packages={title_id: frozenset(ids) for title_id, ids in title_packages.items()},
+        free_title_ids=free_title_ids,
+        rendition_formats=rendition_formats,
+        title_renditions=title_renditions,
+        assets=data["assets"],
+        search=build_search_index(titles, packages_by_id),
+        version=0,
+        history=(),
+    )
+
+
+def _record_version(index: CatalogIndex) -> CatalogIndex:
+    settings = get_settings()
+    version, history = record_version(
+        Path(settings.catalog_history_path),
+        title_fingerprints(index.titles, index.title_packages, index.title_renditions, index.assets),
+        settings.catalog_history_size,
+    )
+    return replace(index, version=version, history=history)
+
+
+class _CatalogLoader:
+    """Keep one parsed catalog per process and reload it when the files change.
+
+    Every lookup costs a couple of ``stat`` calls; the JSON files are only parsed
+    again when their mtime or size differs from the cached snapshot. A reload
+    that fails keeps serving the last good snapshot so a half-written file never
+    takes the API down.
+
+    Snapshots carry version ``0`` until ``track_versions`` is called: only the
+    API records versions, so CLI commands never touch the history file.
+    """
+
+    def __init__(self, paths: Tuple[Path, ...]) -> None:
+        self._paths = paths
+        self._lock = threading.Lock()
+        self._versioned = False
+        self._index: Optional[CatalogIndex] = None
+        self._failed_signature: Optional[FileSignature] = None
+
+    def get(self) -> CatalogIndex:
+        signature = _file_signature(self._paths)
+        index = self._index
+        if index is not None and (
+            index.signature == signature or self._failed_signature == signature
+        ):
+            return index
+
+        with self._lock:
+            index = self._index
+            if index is not None and index.signature == signature:
+                return index
+            try:
+                fresh = _build_index(signature)
+                if self._versioned:
+                    fresh = _record_version(fresh)
+            except CatalogConfigError:
+                if index is None:
+                    raise
+                self._failed_signature = signature
+                logger.exception("Catalog reload failed; keeping the previous snapshot")
+                return index
+            self._index = fresh
+            self._failed_signature = None
+            return fresh
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._failed_signature = None
+
+    def track_versions(self) -> None:
+        with self._lock:
+            self._versioned = True
+            if self._index is not None and self._index.version == 0:
+                self._index = _record_version(self._index)
+
+
+_loader = _CatalogLoader((COMPILED_PATH, *SOURCE_PATHS))
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Return the current catalog snapshot, reloading it if the files changed."""
+
+    return _loader.get()
+
+
+def enable_version_tracking() -> None:
+    """Record the ``VERSION`` of every snapshot this process loads in ``CATALOG_HISTORY_PATH``."""
+
+    _loader.track_versions()
+
+
+def reset_catalog_cache() -> None:
+    """Drop the cached snapshot so the next lookup re-reads the JSON files."""
+
+    _loader.clear()
+
+
+def media_root() -> Path:
+    """Directory holding ``<title>/<LANG>/*.wav``; ``MEDIA_ROOT`` overrides the repo's AUDIOS."""
+
+    configured = get_settings().media_root
+    return Path(configured).resolve() if configured else AUDIOS_DIR
+
+
+def get_titles() -> tuple[str, Dict[str, Dict[str, Any]]]:
+    """Return the audio base path plus title metadata keyed by ID."""
+
+    index = get_catalog_index()
+    return index.path_audios, index.titles
+
+
+def get_packages() -> List[Dict[str, Any]]:
+    return list(get_catalog_index().packages)
+
+
+def get_package_ids() -> FrozenSet[str]:
+    """Return the shared set of known package IDs for O(1) membership checks."""
+
+    return get_catalog_index().package_ids
+
+
 def get_package_definition(package_id: str) -> Dict[str, Any]:
-    for package in get_packages():
-        if package.get("id") == package_id:
-            return package
-    raise CatalogConfigError(f"Unknown package id: {package_id}")
+    package = get_catalog_index().packages_by_id.get(package_id)
+    if package is None:
+        raise CatalogConfigError(f"Unknown package id: {package_id}")
+    return package
 
 
 def get_free_package_definition() -> Dict[str, Any]:
-    for package in get_packages():
-        if package.get("is_free"):
-            return package
-    raise CatalogConfigError("packages.json does not define an is_free package")
+    package = get_catalog_index().free_package
+    if package is None:
+        raise CatalogConfigError("packages.json does not define an is_free package")
+    return package
 
 
 def build_catalog_response(package: Dict[str, Any]) -> Dict[str, Any]:
@@ -70,7 +433,48 @@ def build_catalog_response(package: Dict[str, Any]) -> Dict[str, Any]:
         raise CatalogConfigError(
             f"Package {package.get('id')} references unknown titles: {', '.join(missing)}"
         )
-    return {"PATH_AUDIOS": path, "AUDIOS": catalog}
+    response: Dict[str, Any] = {"PATH_AUDIOS": path, "AUDIOS": catalog}
+    index = get_catalog_index()
+    _attach_renditions(response, index)
+    _attach_assets(response, index)
+    return response
+
+
+def _attach_renditions(response: Dict[str, Any], index: CatalogIndex) -> None:
+    """Add ``RENDITIONS`` (formats + per-title, per-language availability) when transcoded."""
+
+    if not index.rendition_formats:
+        return
+    response["RENDITIONS"] = {
+        "formats": index.rendition_formats,
+        "titles": {
+            title_id: index.title_renditions[title_id]
+            for title_id in response["AUDIOS"]
+            if title_id in index.title_renditions
+        },
+    }
+
+
+def _is_title_level_asset(relative: str) -> bool:
+    """Sentence lists, offset tables, covers and bundles; per-sentence audio is left out."""
+
+    return "/" not in relative or relative.endswith("/bundle.wav")
+
+
+def _attach_assets(response: Dict[str, Any], index: CatalogIndex) -> None:
+    """Add ``ASSETS``: per title, asset path -> content-hashed path (``manage.py fingerprint-assets``)."""
+
+    if not index.assets:
+        return
+    response["ASSETS"] = {
+        title_id: {
+            relative: hashed_name(relative, entry["hash"])
+            for relative, entry in index.assets[title_id].items()
+            if _is_title_level_asset(relative)
+        }
+        for title_id in response["AUDIOS"]
+        if title_id in index.assets
+    }
 
 
 def build_catalog_for_package_id(package_id: str) -> Dict[str, Any]:
@@ -78,6 +482,175 @@ def build_catalog_for_package_id(package_id: str) -> Dict[str, Any]:
     return build_catalog_response(package)
 
 
+def _cached_payload(package: Dict[str, Any]) -> EncodedPayload:
+    index = get_catalog_index()
+    key = package.get("id") or ""
+    payload = index.payloads.get(key)
+    if payload is None:
+        payload = encode_json_payload(build_catalog_response(package))
+        index.payloads.put(key, payload)
+    return payload
+
+
+def get_package_payload(package_id: str) -> EncodedPayload:
+    """Return the serialized catalog of ``package_id`` for the current catalog version."""
+
+    return _cached_payload(get_package_definition(package_id))
+
+
+def get_free_catalog_payload() -> EncodedPayload:
+    """The free catalog plus the ``VERSION`` anonymous clients pass to ``/catalog/changes``."""
+
+    index = get_catalog_index()
+    payload = index.payloads.get("free:")
+    if payload is None:
+        response = build_catalog_response(get_free_package_definition())
+        response["VERSION"] = index.version
+        payload = encode_json_payload(response)
+        index.payloads.put("free:", payload)
+    return payload
+
+
+def export_free_catalog(output: Path) -> int:
+    """Write the static free catalog (the offline fallback of the web pages); return its title count.
+
+    The file is versionless: the history behind ``VERSION`` belongs to the
+    running API, not to whichever machine built the file.
+    """
+
+    response = build_catalog_response(get_free_package_definition())
+    tmp = output.with_name(f".{output.name}.tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(response, fh, ensure_ascii=False, indent=2)
+        fh.write("\n")
+    os.replace(tmp, output)
+    return len(response["AUDIOS"])
+
+
+def _library_package_ids(index: CatalogIndex, package_ids: Iterable[str]) -> Tuple[str, ...]:
+    """Free package first, then the requested packages known to the catalog, in catalog order."""
+
+    wanted = set(package_ids)
+    ordered: List[str] = []
+    if index.free_package is not None and index.free_package.get("id"):
+        ordered.append(index.free_package["id"])
+    for package_id in index.packages_by_id:
+        if package_id in wanted and package_id not in ordered:
+            ordered.append(package_id)
+    return tuple(ordered)
+
+
+def build_library_response(package_ids: Iterable[str]) -> Dict[str, Any]:
+    """Merge the free catalog with ``package_ids`` into one de-duplicated response."""
+
+    index = get_catalog_index()
+    titles: Dict[str, Dict[str, Any]] = {}
+    groups: Dict[str, List[str]] = {}
+    for package_id in _library_package_ids(index, package_ids):
+        catalog = build_catalog_response(index.packages_by_id[package_id])
+        groups[package_id] = list(catalog["AUDIOS"])
+        for title_id, title in catalog["AUDIOS"].items():
+            titles.setdefault(title_id, title)
+    response: Dict[str, Any] = {
+        "PATH_AUDIOS": index.path_audios,
+        "VERSION": index.version,
+        "AUDIOS": titles,
+        "packages": groups,
+    }
+    _attach_renditions(response, index)
+    _attach_assets(response, index)
+    return response
+
+
+def get_library_payload(package_ids: Iterable[str]) -> EncodedPayload:
+    """Return the merged library for ``package_ids``, cached per catalog version.
+
+    The ETag combines the catalog version with the ETags of every member
+    package, so it changes whenever the version or a package catalog does.
+    """
+
+    index = get_catalog_index()
+    members = _library_package_ids(index, package_ids)
+    key = "library:" + ",".join(members)
+    payload = index.payloads.get(key)
+    if payload is None:
+        etag = compute_etag(
+            [str(index.version).encode("ascii")]
+            + [
+                _cached_payload(index.packages_by_id[package_id]).etag.encode("ascii")
+                for package_id in members
+            ]
+        )
+        payload = encode_payload(dump_json(build_library_response(members)), etag=etag)
+        index.payloads.put(key, payload)
+    return payload
+
+
+def build_changes_response(since: int, package_ids: Iterable[str]) -> Dict[str, Any]:
+    """Delta of the library of ``package_ids`` (plus the free catalog) since version ``since``.
+
+    Titles touched since then that the caller can see are returned in full
+    under ``AUDIOS``; the others are listed in ``removed``. ``packages`` always
+    holds the caller's title IDs per package, so a client notices a new or lost
+    package. When the history no longer reaches back to ``since``, only
+    ``resync: true`` is returned and the client must download its library again.
+    """
+
+    index = get_catalog_index()
+    response: Dict[str, Any] = {"VERSION": index.version, "since": since}
+    touched = changed_since(index.version, index.history, since)
+    if touched is None:
+        response["resync"] = True
+        return response
+
+    members = _library_package_ids(index, package_ids)
+    visible = {
+        title_id
+        for package_id in members
+        for title_id in index.packages_by_id[package_id].get("title_ids", [])
+    }
+    response.update(
+        {
+            "resync": False,
+            "PATH_AUDIOS": index.path_audios,
+            "AUDIOS": {
+                title_id: index.titles[title_id]
+                for title_id in index.titles
+                if title_id in touched and title_id in visible
+            },
+            "removed": sorted(
+                title_id for title_id in touched if title_id not in visible or title_id not in index.titles
+            ),
+        }
+    )
+    response["packages"] = {
+        package_id: [
+            title_id
+            for title_id in index.packages_by_id[package_id].get("title_ids", [])
+            if title_id in index.titles
+        ]
+        for package_id in members
+    }
+    if response["AUDIOS"]:
+        _attach_renditions(response, index)
+        _attach_assets(response, index)
+    return response
+
+
+def get_changes_payload(since: int, package_ids: Iterable[str]) -> EncodedPayload:
+    """Return the serialized delta of ``build_changes_response``, cached per catalog version."""
+
+    index = get_catalog_index()
+    members = _library_package_ids(index, package_ids)
+    key = f"changes:{since}:" + ",".join(members)
+    payload = index.payloads.get(key)
+    if payload is None:
+        payload = encode_json_payload(build_changes_response(since, members))
+        if since <= index.version:
+            index.payloads.put(key, payload)
+    return payload
+
+
 def normalize_package_ids(package_ids: Iterable[str]) -> List[str]:
     seen = []
     for package_id in package_ids:
@@ -0,0 +1,247 @@
+"""Validate the catalog sources and compile them into one artifact the backend loads at startup.
+
+``titles.json`` and ``packages.json`` are otherwise only checked lazily:
+unknown package titles fail at request time, and the ``"<LANG>-<title>.json":
+"file"`` keys are never checked at all. ``manage.py compile-catalog`` checks
+every title in parallel:
+
+- every package title exists and package ids are unique;
+- every declared ``<LANG>-<title>.json`` sentence list exists and parses;
+- every sentence has an integer ``n`` and a ``file`` that exists on disk;
+- all languages of a title have the same ``n`` sequence.
+
+When nothing is wrong it writes ``catalog/catalog.compiled.json``, which holds
+the parsed sources plus a content version. The loader in :mod:`backend.catalog`
+reads that one file instead of the sources, as long as it is newer than them.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .catalog import (
+    COMPILED_FORMAT,
+    COMPILED_PATH,
+    CatalogConfigError,
+    media_root,
+    read_catalog_sources,
+    sentence_file,
+)
+from .payloads import compute_etag, dump_json
+
+try:  # pragma: no cover - optional dependency
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+# The player takes the language from any "<LANG>-....json": "file" key and then
+# fetches <LANG>-<title>.json, so the key name itself is only advisory.
+_LANG_KEY_RE = re.compile(r"^([A-Za-z]{2,3})-.+\.json$")
+
+
+@dataclass
+class CompileReport:
+    titles: int = 0
+    sentences: int = 0
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    version: Optional[str] = None
+    output: Optional[Path] = None
+
+    def summary(self) -> str:
+        lines = [f"  warning: {item}" for item in self.warnings]
+        lines.extend(f"  error: {item}" for item in self.errors)
+        state = f"wrote {self.output.name} version={self.version}" if self.output else "not written"
+        lines.append(
+            f"titles={self.titles} sentences={self.sentences} warnings={len(self.warnings)} "
+            f"errors={len(self.errors)} · {state}"
+        )
+        return "\n".join(lines)
+
+
+def _declared_langs(title_id: str, title: Dict[str, Any], warnings: List[str]) -> List[str]:
+    langs: List[str] = []
+    for key, value in title.items():
+        match = _LANG_KEY_RE.match(key) if value == "file" else None
+        if match is None:
+            continue
+        lang = match.group(1)
+        if key != f"{lang}-{title_id}.json":
+            warnings.append(f"{title_id}: key {key} is read as {lang}-{title_id}.json")
+        if lang not in langs:
+            langs.append(lang)
+    return langs
+
+
+def _check_title(
+    title_id: str, title: Dict[str, Any], root: Path, allow_missing_media: bool
+) -> Tuple[List[str], List[str], int]:
+    """Return (errors, warnings, sentence count) for one title; runs in a worker thread."""
+
+    errors: List[str] = []
+    warnings: List[str] = []
+    missing_media = warnings if allow_missing_media else errors
+    if not isinstance(title, dict):
+        return [f"{title_id}: expected an object"], warnings, 0
+    if title.get("id") not in (None, title_id):
+        errors.append(f"{title_id}: id field is {title['id']!r}")
+
+    langs = _declared_langs(title_id, title, warnings)
+    if not langs:
+        errors.append(f'{title_id}: no "<LANG>-{title_id}.json": "file" keys')
+    listed = {lang.strip().upper() for lang in str(title.get("langs", "")).split(",") if lang.strip()}
+    if listed != {lang.upper() for lang in langs}:
+        warnings.append(
+            f"{title_id}: langs field lists {', '.join(sorted(listed)) or '-'} but sentence "
+            f"lists exist for {', '.join(sorted(lang.upper() for lang in langs)) or '-'}"
+        )
+
+    title_dir = root / title_id
+    sequences: Dict[str, List[int]] = {}
+    sentences = 0
+    for lang in langs:
+        list_name = f"{lang}-{title_id}.json"
+        try:
+            with (title_dir / list_name).open("r", encoding="utf-8") as fh:
+                entries = json.load(fh)
+        except FileNotFoundError:
+            missing_media.append(f"{title_id}: missing sentence list {list_name}")
+            continue
+        except json.JSONDecodeError as exc:
+            errors.append(f"{title_id}: invalid JSON in {list_name}: {exc}")
+            continue
+        if not isinstance(entries, list):
+            errors.append(f"{title_id}: {list_name} is not a list")
+            continue
+
+        numbers: List[int] = []
+        for position, entry in enumerate(entries, start=1):
+            n = entry.get("n") if isinstance(entry, dict) else None
+            if not isinstance(n, int) or isinstance(n, bool):
+                errors.append(f"{title_id}: {list_name} entry {position} has no integer n")
+                continue
+            numbers.append(n)
+            audio = str(entry.get("file") or "")
+            if not audio:
+                errors.append(f"{title_id}: {list_name} sentence {n} has no file")
+            elif not (title_dir / sentence_file(audio)).is_file():
+                missing_media.append(f"{title_id}: {list_name} sentence {n} missing {audio}")
+        duplicates = sorted({n for n in numbers if numbers.count(n) > 1})
+        if duplicates:
+            errors.append(
+                f"{title_id}: {list_name} repeats n {', '.join(map(str, duplicates))}"
+            )
+        sequences[lang] = sorted(numbers)
+        sentences += len(numbers)
+
+    if len({tuple(numbers) for numbers in sequences.values()}) > 1:
+        reference_lang, reference = next(iter(sequences.items()))
+        for lang, numbers in sequences.items():
+            if numbers == reference:
+                continue
+            missing = sorted(set(reference) - set(numbers))
+            extra = sorted(set(numbers) - set(reference))
+            errors.append(
+                f"{title_id}: {lang} sentences differ from {reference_lang} "
+                f"(missing n: {', '.join(map(str, missing)) or '-'}; "
+                f"extra n: {', '.join(map(str, extra)) or '-'})"
+            )
+    return errors, warnings, sentences
+
+
+def _check_packages(
+    packages: List[Dict[str, Any]], titles: Dict[str, Any], report: CompileReport
+) -> None:
+    seen: set[str] = set()
+    packaged: set[str] = set()
+    free = []
+    for position, package in enumerate(packages, start=1):
+        package_id = package.get("id") if isinstance(package, dict) else None
+        if not package_id:
+            report.errors.append(f"package #{position} has no id")
+            continue
+        if package_id in seen:
+            report.errors.append(f"package {package_id} is defined more than once")
+        seen.add(package_id)
+        if package.get("is_free"):
+            free.append(package_id)
+        title_ids = package.get("title_ids", [])
+        if not isinstance(title_ids, list):
+            report.errors.append(f"package {package_id}: title_ids is not a list")
+            continue
+        unknown = [title_id for title_id in title_ids if title_id not in titles]
+        if unknown:
+            report.errors.append(
+                f"package {package_id} references unknown titles: {', '.join(unknown)}"
+            )
+        packaged.update(title_ids)
+
+    if not free:
+        report.errors.append("no package has is_free: true")
+    elif len(free) > 1:
+        report.warnings.append(f"several free packages ({', '.join(free)}); using {free[0]}")
+    orphans = sorted(set(titles) - packaged)
+    if orphans:
+        report.warnings.append(f"titles in no package (full access only): {', '.join(orphans)}")
+
+
+def _serialize(artifact: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(artifact)
+    return dump_json(artifact)
+
+
+def compile_catalog(
+    allow_missing_media: bool = False,
+    workers: Optional[int] = None,
+    output: Optional[Path] = COMPILED_PATH,
+) -> CompileReport:
+    """Validate the catalog and, when it is consistent, write the compiled artifact.
+
+    ``output=None`` only validates. Missing sentence lists and audio files are
+    errors unless ``allow_missing_media`` downgrades them to warnings.
+    """
+
+    report = CompileReport()
+    try:
+        data = read_catalog_sources()
+    except CatalogConfigError as exc:
+        report.errors.append(str(exc))
+        return report
+
+    titles: Dict[str, Any] = data["titles"]
+    report.titles = len(titles)
+    _check_packages(data["packages"], titles, report)
+
+    root = media_root()
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4)) as pool:
+        results = pool.map(
+            lambda item: _check_title(item[0], item[1], root, allow_missing_media), titles.items()
+        )
+        for errors, warnings, sentences in results:
+            report.errors.extend(errors)
+            report.warnings.extend(warnings)
+            report.sentences += sentences
+
+    if report.errors or output is None:
+        return report
+
+    report.version = compute_etag([dump_json(data)])
+    artifact = {
+        "format": COMPILED_FORMAT,
+        "version": report.version,
+        "compiled_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "catalog": data,
+    }
+    tmp = output.with_name(f".{output.name}.tmp")
+    tmp.write_bytes(_serialize(artifact))
+    os.replace(tmp, output)
+    report.output = output
+    return report
@@ -0,0 +1,140 @@
+"""Monotonic catalog versions plus a bounded history of per-title changes.
+
+Every time the API loads a catalog snapshot with new content, each title is
+fingerprinted: its metadata, its packages, its renditions and its asset
+hashes. The fingerprints are compared with the ones stored in the history
+file. If anything differs, the version goes up by one and the added, changed
+and removed title IDs are appended to the history. Only the last
+``CATALOG_HISTORY_SIZE`` versions are kept. Other processes (``manage.py``
+commands, the image build) never write the file and see version ``0``.
+
+The file is shared by every worker and updated under an exclusive ``flock``.
+Whichever worker reloads first records the version, and the others read it
+back, so all workers report the same version number for the same content.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+try:  # pragma: no cover - POSIX only
+    import fcntl
+except ImportError:  # pragma: no cover - single-process fallback (e.g. Windows)
+    fcntl = None
+
+logger = logging.getLogger("uvicorn.error")
+
+HISTORY_VERSION = 1
+CatalogHistory = Tuple[Dict[str, Any], ...]
+
+
+def title_fingerprints(
+    titles: Mapping[str, Any],
+    title_packages: Mapping[str, Any],
+    title_renditions: Mapping[str, Any],
+    assets: Mapping[str, Any],
+) -> Dict[str, str]:
+    fingerprints = {}
+    for title_id, title in titles.items():
+        state = [
+            title,
+            sorted(title_packages.get(title_id, ())),
+            title_renditions.get(title_id),
+            {relative: entry.get("hash") for relative, entry in assets.get(title_id, {}).items()},
+        ]
+        encoded = json.dumps(state, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        fingerprints[title_id] = hashlib.sha256(encoded).hexdigest()[:16]
+    return fingerprints
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f".{path.name}.lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def _read(path: Path) -> Dict[str, Any]:
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            state = json.load(fh)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        logger.warning("Ignoring unreadable catalog history %s; versions restart", path)
+        return {}
+    return state if state.get("format") == HISTORY_VERSION else {}
+
+
+def record_version(
+    path: Path, fingerprints: Dict[str, str], keep: int
+) -> Tuple[int, CatalogHistory]:
+    """Return the version of ``fingerprints``, appending a history entry when they changed.
+
+    When the file cannot be written, versioning is disabled (version ``0``, no history)
+    and ``/catalog/changes`` asks every client to resync.
+    """
+
+    try:
+        with _locked(path):
+            state = _read(path)
+            previous: Dict[str, str] = state.get("titles", {})
+            version = int(state.get("version", 0))
+            history: List[Dict[str, Any]] = state.get("history", [])
+            if state and previous == fingerprints:
+                return version, tuple(history)
+
+            version += 1
+            history.append(
+                {
+                    "version": version,
+                    "added": sorted(set(fingerprints) - set(previous)),
+                    "changed": sorted(
+                        title_id
+                        for title_id, digest in fingerprints.items()
+                        if title_id in previous and previous[title_id] != digest
+                    ),
+                    "removed": sorted(set(previous) - set(fingerprints)),
+                }
+            )
+            history = history[-keep:] if keep > 0 else []
+            tmp = path.with_name(f".{path.name}.tmp")
+            with tmp.open("w", encoding="utf-8") as fh:
+                json.dump(
+                    {"format": HISTORY_VERSION, "version": version, "titles": fingerprints, "history": history},
+                    fh,
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                )
+            os.replace(tmp, path)
+            return version, tuple(history)
+    except OSError as exc:
+        logger.warning("Catalog history %s unavailable (%s); delta sync disabled", path, exc)
+        return 0, ()
+
+
+def changed_since(version: int, history: Sequence[Dict[str, Any]], since: int) -> Optional[Set[str]]:
+    """Title IDs touched after ``since``, or None when the history cannot answer (resync)."""
+
+    if version == 0 or since > version:
+        return None
+    if since == version:
+        return set()
+    if not history or history[0]["version"] > since + 1:
+        return None
+    touched: Set[str] = set()
+    for entry in history:
+        if entry["version"] > since:
+            touched.update(entry["added"], entry["changed"], entry["removed"])
+    return touched
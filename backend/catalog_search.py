@@ -0,0 +1,165 @@
+"""Inverted indexes over the catalog's facet fields, built once per catalog snapshot.
+
+Titles are numbered in catalog order and every facet value maps to a Python
+``int`` used as a bitset: bit ``i`` is set when title ``i`` has that value.
+Filters become ``&``/``|`` over a handful of integers, totals and facet counts
+are ``int.bit_count()``, and only the requested page of titles is ever
+materialized. ``levels``, ``langs`` and the other free-text fields are split
+and normalized here once, instead of on every client-side filter.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+# Query facet -> title field. ``lang`` and ``level`` hold comma-separated lists.
+FACET_FIELDS = {"level": "levels", "lang": "langs", "ages": "ages", "collection": "colection"}
+_LIST_FACETS = {"level", "lang"}
+_AGES_RE = re.compile(r"^\s*(\d+)\s*-\s*(\d+)\s*$")
+
+
+def normalize_text(value: str) -> str:
+    """Case- and accent-insensitive form: ``"Lá càsa"`` -> ``"la casa"``."""
+
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return " ".join("".join(ch for ch in decomposed if not unicodedata.combining(ch)).split())
+
+
+def _facet_key(facet: str, value: str) -> str:
+    return value.strip().upper() if facet in _LIST_FACETS else normalize_text(value)
+
+
+def _facet_values(facet: str, raw: Any) -> List[str]:
+    if not isinstance(raw, str):
+        return []
+    parts = raw.split(",") if facet in _LIST_FACETS else [raw]
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    order: Tuple[str, ...]
+    positions: Dict[str, int]
+    all_mask: int
+    facets: Dict[str, Dict[str, int]]
+    labels: Dict[str, Dict[str, str]]
+    package_masks: Dict[str, int]
+    age_ranges: Tuple[Tuple[int, int, int], ...]
+    text: Tuple[str, ...]
+
+    def mask_for(self, facet: str, values: Sequence[str], match_all: bool = False) -> int:
+        masks = [self.facets[facet].get(_facet_key(facet, value), 0) for value in values]
+        if not masks:
+            return self.all_mask
+        result = masks[0]
+        for mask in masks[1:]:
+            result = result & mask if match_all else result | mask
+        return result
+
+    def age_mask(self, age: int) -> int:
+        mask = 0
+        for low, high, titles in self.age_ranges:
+            if low <= age <= high:
+                mask |= titles
+        return mask
+
+    def packages_mask(self, package_ids: Iterable[str]) -> int:
+        mask = 0
+        for package_id in package_ids:
+            mask |= self.package_masks.get(package_id, 0)
+        return mask
+
+    def titles_mask(self, title_ids: Iterable[str]) -> int:
+        mask = 0
+        for title_id in title_ids:
+            position = self.positions.get(title_id)
+            if position is not None:
+                mask |= 1 << position
+        return mask
+
+    def text_mask(self, query: str, candidates: int) -> int:
+        """Titles among ``candidates`` whose title or description contains every query word."""
+
+        words = normalize_text(query).split()
+        mask = 0
+        for position in _bits(candidates):
+            if all(word in self.text[position] for word in words):
+                mask |= 1 << position
+        return mask
+
+    def page(self, mask: int, offset: int, limit: int) -> List[str]:
+        ids: List[str] = []
+        for skipped, position in enumerate(_bits(mask)):
+            if skipped < offset:
+                continue
+            if len(ids) == limit:
+                break
+            ids.append(self.order[position])
+        return ids
+
+    def facet_counts(self, mask: int) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        for facet, values in self.facets.items():
+            labels = self.labels[facet]
+            facet_counts = {labels[key]: (mask & titles).bit_count() for key, titles in values.items()}
+            counts[facet] = {label: count for label, count in facet_counts.items() if count}
+        return counts
+
+
+def build_search_index(
+    titles: Mapping[str, Mapping[str, Any]], packages_by_id: Mapping[str, Mapping[str, Any]]
+) -> SearchIndex:
+    order = tuple(titles)
+    position_of = {title_id: position for position, title_id in enumerate(order)}
+    facets: Dict[str, Dict[str, int]] = {facet: {} for facet in FACET_FIELDS}
+    labels: Dict[str, Dict[str, str]] = {facet: {} for facet in FACET_FIELDS}
+    age_ranges: Dict[Tuple[int, int], int] = {}
+    text: List[str] = []
+
+    for position, title_id in enumerate(order):
+        title = titles[title_id]
+        bit = 1 << position
+        for facet, field_name in FACET_FIELDS.items():
+            for value in _facet_values(facet, title.get(field_name)):
+                key = _facet_key(facet, value)
+                facets[facet][key] = facets[facet].get(key, 0) | bit
+                labels[facet].setdefault(key, value.upper() if facet in _LIST_FACETS else value)
+        match = _AGES_RE.match(str(title.get("ages") or ""))
+        if match:
+            bounds = (int(match.group(1)), int(match.group(2)))
+            age_ranges[bounds] = age_ranges.get(bounds, 0) | bit
+        text.append(normalize_text(f"{title.get('title-human', '')} {title.get('description', '')}"))
+
+    package_masks: Dict[str, int] = {}
+    for package_id, package in packages_by_id.items():
+        mask = 0
+        for title_id in package.get("title_ids", []):
+            if title_id in position_of:
+                mask |= 1 << position_of[title_id]
+        package_masks[package_id] = mask
+
+    return SearchIndex(
+        order=order,
+        positions=position_of,
+        all_mask=(1 << len(order)) - 1,
+        facets=facets,
+        labels=labels,
+        package_masks=package_masks,
+        age_ranges=tuple((low, high, mask) for (low, high), mask in sorted(age_ranges.items())),
+        text=tuple(text),
+    )
+
+
+def project(title_id: str, title: Mapping[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return {"id": title_id, **title}
+    return {"id": title_id, **{name: title[name] for name in fields if name in title}}
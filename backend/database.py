@@ -1,19 +1,306 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, declarative_base, sessionmaker
+import asyncio
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.sql import Executable
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from .settings import get_settings
 
 settings = get_settings()
+logger = logging.getLogger("uvicorn.error")
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def _async_database_url(url: str) -> str:
+    """Swap the sync driver of ``url`` for its asyncio counterpart."""
+
+    sa_url = make_url(url)
+    backend = sa_url.get_backend_name()
+    driver = _ASYNC_DRIVERS.get(backend)
+    if driver is None or sa_url.drivername == driver:
+        return url
+    return sa_url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    sa_url = make_url(url)
+    return sa_url.get_backend_name() == "sqlite" and sa_url.database in (None, "", ":memory:")
+
+
+def _engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """Pool settings from the environment; in-memory SQLite keeps its single-connection pool."""
+
+    if _is_memory_sqlite(url):
+        return {}
+    options: Dict[str, Any] = {}
+    if is_async and _is_sqlite(url):
+        # aiosqlite defaults to NullPool; pooling keeps the pragmas and page cache warm.
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return {
+        **options,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+
+
+def sqlite_pragmas() -> List[str]:
+    return [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}",
+        f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}",
+        f"PRAGMA cache_size={int(settings.sqlite_cache_size)}",
+    ]
 
-engine = create_engine(settings.database_url, future=True)
+
+def apply_sqlite_pragmas(dbapi_connection: Any, connection_record: Any = None) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _configure_engine(bind: Engine, url: str) -> Engine:
+    if _is_sqlite(url) and not _is_memory_sqlite(url):
+        event.listen(bind, "connect", apply_sqlite_pragmas)
+    return bind
+
+
+# Sync engine: schema creation and the manage.py CLI.
+engine = _configure_engine(
+    create_engine(settings.database_url, future=True, **_engine_options(settings.database_url)),
+    settings.database_url,
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+# Async engine: every request handler.
+_async_url = settings.async_database_url or _async_database_url(settings.database_url)
+async_engine = create_async_engine(_async_url, **_engine_options(_async_url, is_async=True))
+_configure_engine(async_engine.sync_engine, _async_url)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
-def get_db() -> Session:
-    db = SessionLocal()
-    try:
+@dataclass
+class _PendingWrite:
+    statement: Executable
+    loop: asyncio.AbstractEventLoop
+    future: "asyncio.Future[int]"
+
+    def resolve(self, rowcount: Optional[int] = None, error: Optional[BaseException] = None) -> None:
+        self.loop.call_soon_threadsafe(self._set, rowcount, error)
+
+    def _set(self, rowcount: Optional[int], error: Optional[BaseException]) -> None:
+        if self.future.done():
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(rowcount)
+
+
+class GroupCommitWriter:
+    """Single writer thread that commits small SQLite writes in groups.
+
+    SQLite serializes writers and every commit pays for a WAL sync, so a burst
+    of magic-link inserts and ``used_at`` updates queues up behind one commit at
+    a time. Here the writer collects statements for at most ``max_delay``
+    seconds (or ``max_batch`` statements), runs them in one transaction on the
+    sync engine and commits once. Each caller awaits its own statement's row
+    count, so it only returns after the write is durable. When a group fails,
+    its statements are retried one transaction each so a single bad write
+    cannot fail its neighbours.
+    """
+
+    def __init__(self, bind: Engine, max_delay: float, max_batch: int) -> None:
+        self.bind = bind
+        self.max_delay = max_delay
+        self.max_batch = max(1, max_batch)
+        self.metrics = {"writes": 0, "commits": 0, "fallbacks": 0}
+        self._queue: "queue.Queue[Optional[_PendingWrite]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join()
+
+    async def execute(self, statement: Executable) -> int:
+        """Queue ``statement`` and wait until the group it landed in has committed."""
+
+        if self._thread is None:
+            raise RuntimeError("Group-commit writer is not running")
+        loop = asyncio.get_running_loop()
+        pending = _PendingWrite(statement, loop, loop.create_future())
+        self._queue.put(pending)
+        return await pending.future
+
+    def _collect(self, first: _PendingWrite) -> tuple[List[_PendingWrite], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._commit(batch)
+        # Drain anything queued after the stop marker.
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self._commit([item])
+
+    def _commit(self, batch: List[_PendingWrite]) -> None:
+        try:
+            with self.bind.begin() as conn:
+                rowcounts = [conn.execute(item.statement).rowcount for item in batch]
+        except Exception:
+            if len(batch) == 1:
+                self._commit_one(batch[0])
+                return
+            self.metrics["fallbacks"] += 1
+            logger.warning("Group commit of %d writes failed; retrying individually", len(batch))
+            for item in batch:
+                self._commit_one(item)
+            return
+        self.metrics["writes"] += len(batch)
+        self.metrics["commits"] += 1
+        for item, rowcount in zip(batch, rowcounts):
+            item.resolve(rowcount)
+
+    def _commit_one(self, item: _PendingWrite) -> None:
+        try:
+            with self.bind.begin() as conn:
+                rowcount = conn.execute(item.statement).rowcount
+        except Exception as exc:
+            item.resolve(error=exc)
+            return
+        self.metrics["writes"] += 1
+        self.metrics["commits"] += 1
+        item.resolve(rowcount)
+
+
+group_commit_writer = GroupCommitWriter(
+    engine,
+    max_delay=settings.sqlite_group_commit_max_delay_ms / 1000,
+    max_batch=settings.sqlite_group_commit_max_batch,
+)
+
+
+def group_commit_enabled() -> bool:
+    return (
+        settings.sqlite_group_commit
+        and _is_sqlite(settings.database_url)
+        and not _is_memory_sqlite(settings.database_url)
+    )
+
+
+async def execute_write(db: AsyncSession, statement: Executable) -> int:
+    """Run a single INSERT/UPDATE and commit it; returns the affected row count.
+
+    With the group-commit writer running the statement joins the next group;
+    the session's read transaction is ended first so it never holds a lock the
+    writer is waiting for.
+    """
+
+    if group_commit_writer.running:
+        await db.commit()
+        return await group_commit_writer.execute(statement)
+    result = await db.execute(statement)
+    await db.commit()
+    return result.rowcount
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def upgrade_schema(bind: Engine) -> None:
+    """Add columns and indexes introduced after a table was first created.
+
+    ``create_all`` never alters existing tables, so databases created by older
+    releases would miss new columns and indexes. Only additive columns that
+    carry a server default are handled; indexes whose uniqueness changed are
+    dropped and recreated.
+    """
+
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present or column.server_default is None:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                not_null = "" if column.nullable else " NOT NULL"
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                        f"{not_null} DEFAULT {column.server_default.arg}"
+                    )
+                )
+            indexes = {
+                index["name"]: bool(index["unique"]) for index in inspector.get_indexes(table.name)
+            }
+            for index in table.indexes:
+                if index.name in indexes:
+                    if indexes[index.name] == bool(index.unique):
+                        continue
+                    index.drop(conn)
+                index.create(conn)
@@ -1,11 +1,18 @@
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, Optional, Tuple
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from .database import get_db
+from .entitlements import CLAIM_KEY, Entitlements
 from .models import User
 from .settings import get_settings
 
@@ -22,14 +29,18 @@ def _extract_token(
     return request.cookies.get(settings.auth_cookie_name)
 
 
-def _decode_token(token: str) -> int:
+def _decode_payload(token: str) -> Dict[str, Any]:
     try:
-        payload = jwt.decode(
-            token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
-        )
+        return jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
     except JWTError as exc:  # pragma: no cover - runtime validation
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from exc
 
+
+def _decode_token(token: str) -> int:
+    return _user_id_from_payload(_decode_payload(token))
+
+
+def _user_id_from_payload(payload: Dict[str, Any]) -> int:
     user_id = payload.get("sub")
     if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
@@ -39,17 +50,23 @@ def _decode_token(token: str) -> int:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload") from exc
 
 
-def get_current_user(
+async def get_current_user(
     request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> User:
     token = _extract_token(request, credentials)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
-    user_id = _decode_token(token)
-    user = db.query(User).filter(User.id == user_id).first()
+    return await _load_active_user(db, _decode_token(token))
+
+
+async def _load_active_user(db: AsyncSession, user_id: int) -> User:
+    result = await db.execute(
+        select(User).options(selectinload(User.package_links)).where(User.id == user_id)
+    )
+    user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     if not user.is_active:
@@ -57,7 +74,173 @@ def get_current_user(
     return user
 
 
-def get_current_full_access_user(
+def _entitlements_from_claim(payload: Dict[str, Any], user_id: int) -> Optional[Entitlements]:
+    """Return the token's entitlement claim unless it is missing, stale or inactive."""
+
+    if not settings.jwt_embed_entitlements or CLAIM_KEY not in payload:
+        return None
+    issued_at = payload.get("iat")
+    if not isinstance(issued_at, (int, float)):
+        return None
+    if time.time() - issued_at > settings.jwt_entitlement_max_age_minutes * 60:
+        return None
+    entitlements = Entitlements.from_claim(user_id, payload[CLAIM_KEY])
+    if entitlements is None or not entitlements.is_active:
+        return None
+    return entitlements
+
+
+class _EntitlementCache:
+    """Bounded TTL + LRU map of user id to entitlement snapshot.
+
+    Entries younger than ``revalidate_seconds`` are served straight from memory.
+    Older ones are confirmed with a single-row ``entitlement_version`` lookup, so
+    grants made through another worker are noticed without reloading the user.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, revalidate_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        # user_id -> (snapshot, loaded_at, checked_at)
+        self._entries: "OrderedDict[int, Tuple[Entitlements, float, float]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[Tuple[Entitlements, float]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            snapshot, loaded_at, checked_at = entry
+            if now - loaded_at > self.ttl_seconds:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot, checked_at
+
+    def put(self, snapshot: Entitlements) -> None:
+        if self.maxsize <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[snapshot.user_id] = (replace(snapshot, verified=False), now, now)
+            self._entries.move_to_end(snapshot.user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def mark_checked(self, user_id: int) -> None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = (entry[0], entry[1], time.monotonic())
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+_entitlement_cache = _EntitlementCache(
+    maxsize=settings.entitlement_cache_size,
+    ttl_seconds=settings.entitlement_cache_ttl_seconds,
+    revalidate_seconds=settings.entitlement_cache_revalidate_seconds,
+)
+
+
+def invalidate_entitlements(user_id: Optional[int] = None) -> None:
+    """Forget cached entitlements for ``user_id`` (or everyone) in this process."""
+
+    _entitlement_cache.invalidate(user_id)
+
+
+async def _load_entitlements(db: AsyncSession, user_id: int) -> Entitlements:
+    entitlements = Entitlements.from_user(await _load_active_user(db, user_id))
+    _entitlement_cache.put(entitlements)
+    return entitlements
+
+
+async def _cached_entitlements(db: AsyncSession, user_id: int) -> Entitlements:
+    cached = _entitlement_cache.get(user_id)
+    if cached is None:
+        return await _load_entitlements(db, user_id)
+
+    snapshot, checked_at = cached
+    if time.monotonic() - checked_at < _entitlement_cache.revalidate_seconds:
+        return snapshot
+
+    result = await db.execute(
+        select(User.entitlement_version, User.is_active).where(User.id == user_id)
+    )
+    row = result.first()
+    if row is None or not row.is_active or row.entitlement_version != snapshot.version:
+        _entitlement_cache.invalidate(user_id)
+        return await _load_entitlements(db, user_id)
+    _entitlement_cache.mark_checked(user_id)
+    return snapshot
+
+
+async def get_current_entitlements(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Entitlements:
+    """Authorize from the token claim or the entitlement cache, falling back to the database."""
+
+    token = _extract_token(request, credentials)
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+
+    payload = _decode_payload(token)
+    user_id = _user_id_from_payload(payload)
+    entitlements = _entitlements_from_claim(payload, user_id)
+    if entitlements is not None:
+        return entitlements
+    return await _cached_entitlements(db, user_id)
+
+
+async def get_optional_entitlements(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Optional[Entitlements]:
+    """Like :func:`get_current_entitlements`, but anonymous callers get ``None``."""
+
+    if not _extract_token(request, credentials):
+        return None
+    return await get_current_entitlements(request, credentials, db)
+
+
+async def refresh_entitlements(db: AsyncSession, entitlements: Entitlements) -> Entitlements:
+    """Reload an unverified snapshot from the database (e.g. after a denied check)."""
+
+    if entitlements.verified:
+        return entitlements
+    return await _load_entitlements(db, entitlements.user_id)
+
+
+async def confirm_entitlements(db: AsyncSession, entitlements: Entitlements) -> Entitlements:
+    """Check an unverified snapshot's ``entitlement_version`` and reload it only when outdated.
+
+    For responses that list everything a user owns, where a denied check never
+    happens to trigger :func:`refresh_entitlements`. Costs one primary-key lookup.
+    """
+
+    if entitlements.verified:
+        return entitlements
+    result = await db.execute(
+        select(User.entitlement_version, User.is_active).where(User.id == entitlements.user_id)
+    )
+    row = result.first()
+    if row is None or not row.is_active or row.entitlement_version != entitlements.version:
+        _entitlement_cache.invalidate(entitlements.user_id)
+        return await _load_entitlements(db, entitlements.user_id)
+    return entitlements
+
+
+async def get_current_full_access_user(
     current_user: User = Depends(get_current_user),
 ) -> User:
     if not current_user.has_any_package():
@@ -1,13 +1,22 @@
 import logging
+import queue
 import smtplib
+import threading
+import time
+from dataclasses import dataclass
 from email.message import EmailMessage
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
 
 from .settings import get_settings
 
 logger = logging.getLogger("uvicorn.error")
 settings = get_settings()
 
+# A pooled connection idle for longer than this is probed with NOOP before reuse.
+_NOOP_AFTER_SECONDS = 5.0
+
 
 def send_magic_link_email(recipient: str, magic_link_url: str, raw_token: str) -> bool:
     """Send the login email and log the URL whenever delivery is skipped."""
@@ -23,27 +32,25 @@ def send_magic_link_email(recipient: str, magic_link_url: str, raw_token: str) -
     return False
 
 
-def _send_email(
-    recipient: str, subject: str, text_body: str, html_body: Optional[str] = None
-) -> Tuple[bool, Optional[str]]:
-    if not settings.email_enabled:
-        reason = "EMAIL_ENABLED is false"
-        logger.info(
-            "Skipping email send because EMAIL_ENABLED is false. Intended to send to %s with subject %s",
-            recipient,
-            subject,
-        )
-        return False, reason
+async def dispatch_magic_link_email(recipient: str, magic_link_url: str, raw_token: str) -> bool:
+    """Hand the email to the background outbox, or send it in the threadpool when it is off."""
+
+    if email_outbox.running:
+        return email_outbox.enqueue_magic_link(recipient, magic_link_url, raw_token)
+    return await run_in_threadpool(send_magic_link_email, recipient, magic_link_url, raw_token)
+
 
+def _delivery_skipped_reason() -> Optional[str]:
+    if not settings.email_enabled:
+        return "EMAIL_ENABLED is false"
     if not settings.smtp_host:
-        reason = "SMTP configuration missing"
-        logger.info(
-            "Skipping email send because SMTP configuration is missing. Intended to send to %s with subject %s",
-            recipient,
-            subject,
-        )
-        return False, reason
+        return "SMTP configuration missing"
+    return None
+
 
+def _build_message(
+    recipient: str, subject: str, text_body: str, html_body: Optional[str] = None
+) -> EmailMessage:
     message = EmailMessage()
     message["From"] = settings.email_from_address
     message["To"] = recipient
@@ -51,14 +58,36 @@ def _send_email(
     message.set_content(text_body)
     if html_body:
         message.add_alternative(html_body, subtype="html")
+    return message
+
+
+def _open_smtp() -> smtplib.SMTP:
+    smtp = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout_seconds)
+    if settings.smtp_use_tls:
+        smtp.starttls()
+    if settings.smtp_username and settings.smtp_password:
+        smtp.login(settings.smtp_username, settings.smtp_password)
+    return smtp
+
+
+def _send_email(
+    recipient: str, subject: str, text_body: str, html_body: Optional[str] = None
+) -> Tuple[bool, Optional[str]]:
+    reason = _delivery_skipped_reason()
+    if reason:
+        logger.info(
+            "Skipping email send because %s. Intended to send to %s with subject %s",
+            reason,
+            recipient,
+            subject,
+        )
+        return False, reason
+
+    message = _build_message(recipient, subject, text_body, html_body)
 
     smtp: Optional[smtplib.SMTP] = None
     try:
-        smtp = smtplib.SMTP(settings.smtp_host, settings.smtp_port)
-        if settings.smtp_use_tls:
-            smtp.starttls()
-        if settings.smtp_username and settings.smtp_password:
-            smtp.login(settings.smtp_username, settings.smtp_password)
+        smtp = _open_smtp()
         smtp.send_message(message)
         return True, None
     except Exception as exc:  # pragma: no cover - network/SMTP failures in prod
@@ -72,6 +101,196 @@ def _send_email(
                 logger.debug("SMTP quit failed: %s", quit_exc)
 
 
+class _PooledSMTPConnection:
+    """A single SMTP session kept open between messages and probed before reuse."""
+
+    def __init__(self) -> None:
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def send(self, message: EmailMessage) -> None:
+        smtp = self._acquire()
+        try:
+            smtp.send_message(message)
+        except smtplib.SMTPResponseException:
+            # The session is still usable after a per-message rejection.
+            self._last_used = time.monotonic()
+            raise
+        except Exception:
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self) -> None:
+        if self._smtp is not None and self._idle_for() > settings.smtp_max_idle_seconds:
+            self.close()
+
+    def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception as exc:  # pragma: no cover - network teardown failures
+            logger.debug("SMTP quit failed: %s", exc)
+            smtp.close()
+
+    def _idle_for(self) -> float:
+        return time.monotonic() - self._last_used
+
+    def _acquire(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            idle = self._idle_for()
+            if idle > settings.smtp_max_idle_seconds:
+                self.close()
+            elif idle > _NOOP_AFTER_SECONDS and not self._healthy():
+                self.close()
+        if self._smtp is None:
+            self._smtp = _open_smtp()
+            self._last_used = time.monotonic()
+        return self._smtp
+
+    def _healthy(self) -> bool:
+        try:
+            return self._smtp is not None and self._smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+
+@dataclass
+class _QueuedEmail:
+    recipient: str
+    subject: str
+    text_body: str
+    html_body: Optional[str]
+    raw_token: str
+    magic_link_url: str
+
+
+class EmailOutbox:
+    """Bounded background queue that delivers email over pooled SMTP connections.
+
+    Each worker thread owns one persistent connection. Transient failures are
+    retried with exponential backoff; 5xx rejections and exhausted retries fall
+    back to logging the magic link, exactly like inline delivery does.
+    """
+
+    _STOP = object()
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[object]" = queue.Queue(maxsize=settings.email_queue_max_size)
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self._metrics: Dict[str, int] = dict.fromkeys(
+            ("enqueued", "sent", "retried", "failed", "skipped", "dropped"), 0
+        )
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        if self.running or not settings.email_queue_enabled:
+            return
+        self._stopping.clear()
+        for index in range(max(1, settings.email_queue_workers)):
+            thread = threading.Thread(
+                target=self._worker, name=f"email-outbox-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Deliver what is already queued (within ``timeout``) and stop the workers."""
+
+        if not self.running:
+            return
+        deadline = time.monotonic() + (
+            settings.email_queue_drain_seconds if timeout is None else timeout
+        )
+        for _ in self._threads:
+            self._queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._stopping.set()
+        self._threads = []
+        logger.info("Email outbox stopped: %s", self.metrics())
+
+    def enqueue_magic_link(self, recipient: str, magic_link_url: str, raw_token: str) -> bool:
+        subject, text_body, html_body = _build_magic_link_email(magic_link_url)
+        item = _QueuedEmail(recipient, subject, text_body, html_body, raw_token, magic_link_url)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count("dropped")
+            _log_magic_link_fallback(recipient, raw_token, magic_link_url, "email queue full")
+            return False
+        self._count("enqueued")
+        return True
+
+    def metrics(self) -> Dict[str, int]:
+        with self._metrics_lock:
+            snapshot = dict(self._metrics)
+        snapshot["queued"] = self._queue.qsize()
+        return snapshot
+
+    def _count(self, key: str) -> None:
+        with self._metrics_lock:
+            self._metrics[key] += 1
+
+    def _worker(self) -> None:
+        connection = _PooledSMTPConnection()
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=1.0)
+                except queue.Empty:
+                    connection.close_if_idle()
+                    continue
+                if item is self._STOP:
+                    return
+                self._deliver(connection, item)
+        finally:
+            connection.close()
+
+    def _deliver(self, connection: _PooledSMTPConnection, item: _QueuedEmail) -> None:
+        reason = _delivery_skipped_reason()
+        if reason:
+            self._count("skipped")
+            _log_magic_link_fallback(item.recipient, item.raw_token, item.magic_link_url, reason)
+            return
+
+        message = _build_message(item.recipient, item.subject, item.text_body, item.html_body)
+        max_attempts = max(1, settings.email_max_attempts)
+        for attempt in range(1, max_attempts + 1):
+            try:
+                connection.send(message)
+            except Exception as exc:
+                permanent = isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+                if permanent or attempt == max_attempts or self._stopping.is_set():
+                    self._count("failed")
+                    logger.warning(
+                        "Failed to send magic link email to %s after %d attempt(s): %s",
+                        item.recipient,
+                        attempt,
+                        exc,
+                    )
+                    _log_magic_link_fallback(
+                        item.recipient, item.raw_token, item.magic_link_url, f"SMTP send failed: {exc}"
+                    )
+                    return
+                self._count("retried")
+                self._stopping.wait(settings.email_retry_backoff_seconds * 2 ** (attempt - 1))
+                continue
+            self._count("sent")
+            logger.info("Magic link email sent to %s", item.recipient)
+            return
+
+
+email_outbox = EmailOutbox()
+
+
 def _build_magic_link_email(magic_link_url: str) -> tuple[str, str, str]:
     expiration_minutes = settings.magic_link_expiration_minutes
     subject = "Audiovook · Enllaç màgic / Magic login link"
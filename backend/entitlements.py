@@ -0,0 +1,76 @@
+"""Immutable entitlement snapshots shared by JWT claims and the auth dependencies."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from .catalog import CatalogConfigError, get_catalog_index
+
+CLAIM_KEY = "ent"
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    """What a user may access; ``verified`` is False for token- or cache-derived copies."""
+
+    user_id: int
+    is_active: bool
+    full_access: bool
+    package_ids: FrozenSet[str]
+    version: int
+    verified: bool = True
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Entitlements":
+        return cls(
+            user_id=user.id,
+            is_active=bool(user.is_active),
+            full_access=bool(user.full_access),
+            package_ids=user.package_id_set,
+            version=user.entitlement_version or 0,
+        )
+
+    @classmethod
+    def from_claim(cls, user_id: int, claim: Any) -> Optional["Entitlements"]:
+        """Rebuild a snapshot from a token claim, or None when it is malformed."""
+
+        if not isinstance(claim, dict):
+            return None
+        packages = claim.get("pkg", [])
+        version = claim.get("v")
+        if not isinstance(packages, list) or not isinstance(version, int):
+            return None
+        return cls(
+            user_id=user_id,
+            is_active=bool(claim.get("act")),
+            full_access=bool(claim.get("fa")),
+            package_ids=frozenset(str(pkg) for pkg in packages),
+            version=version,
+            verified=False,
+        )
+
+    def to_claim(self) -> Dict[str, Any]:
+        claim: Dict[str, Any] = {"v": self.version, "act": self.is_active}
+        if self.full_access:
+            claim["fa"] = True
+        else:
+            claim["pkg"] = sorted(self.package_ids)
+        return claim
+
+    @property
+    def packages(self) -> List[str]:
+        if self.full_access:
+            try:
+                return list(get_catalog_index().packages_by_id)
+            except CatalogConfigError:
+                pass
+        return sorted(self.package_ids)
+
+    def has_any_package(self) -> bool:
+        return self.full_access or bool(self.package_ids)
+
+    def can_access_package(self, package_id: str) -> bool:
+        return self.full_access or package_id in self.package_ids
+
+    def can_access_any(self, package_ids: Iterable[str]) -> bool:
+        return self.full_access or any(package_id in self.package_ids for package_id in package_ids)
@@ -0,0 +1,124 @@
+"""Content fingerprints of every asset under the media root, for immutable hashed URLs.
+
+``manage.py fingerprint-assets`` walks ``<title>/`` directories and records
+the SHA-256 prefix of each file in ``catalog/fingerprints.json``, along with
+its size and mtime. A later run only re-hashes files whose size or mtime
+changed. The catalog turns the hashes into names like ``CA/0001.<hash>.wav``.
+Nginx (``/AUDIOS/``) and ``/media`` map those names back to the real file and
+serve them as ``immutable``: new content gets a new URL.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .catalog import FINGERPRINTS_PATH, get_catalog_index, media_root
+
+FINGERPRINT_VERSION = 1
+HASH_LENGTH = 16
+
+
+@dataclass(frozen=True)
+class FingerprintReport:
+    files: int
+    hashed: int
+    removed: int
+    hashed_bytes: int
+
+    def summary(self) -> str:
+        return (
+            f"files={self.files} hashed={self.hashed} unchanged={self.files - self.hashed} "
+            f"removed={self.removed} read={self.hashed_bytes / 1024 / 1024:.1f} MiB"
+        )
+
+
+def _digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def _asset_files(title_dir: Path) -> List[Path]:
+    """Every regular file of a title, skipping dotfiles such as half-written ``.tmp`` outputs."""
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(title_dir):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        files.extend(Path(dirpath) / name for name in sorted(filenames) if not name.startswith("."))
+    return files
+
+
+def fingerprint_assets(
+    workers: Optional[int] = None, force: bool = False, manifest_path: Path = FINGERPRINTS_PATH
+) -> FingerprintReport:
+    """Refresh the fingerprints of every catalog title's files; unchanged files keep their hash."""
+
+    previous: Dict[str, Dict[str, Any]] = {}
+    if manifest_path.exists() and not force:
+        with manifest_path.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if data.get("version") == FINGERPRINT_VERSION:
+            previous = data.get("titles", {})
+
+    root = media_root()
+    titles: Dict[str, Dict[str, Any]] = {}
+    pending: List[Tuple[str, str, Path, os.stat_result]] = []
+    for title_id in get_catalog_index().titles:
+        title_dir = root / title_id
+        if not title_dir.is_dir():
+            continue
+        known = previous.get(title_id, {})
+        entries = titles.setdefault(title_id, {})
+        for path in _asset_files(title_dir):
+            relative = path.relative_to(title_dir).as_posix()
+            stat = path.stat()
+            cached = known.get(relative)
+            if (
+                cached is not None
+                and cached.get("size") == stat.st_size
+                and cached.get("mtime_ns") == stat.st_mtime_ns
+            ):
+                entries[relative] = cached
+            else:
+                pending.append((title_id, relative, path, stat))
+
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4)) as pool:
+        digests = pool.map(lambda job: _digest(job[2]), pending)
+        for (title_id, relative, _, stat), digest in zip(pending, digests):
+            titles[title_id][relative] = {
+                "hash": digest,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+
+    removed = sum(
+        relative not in titles.get(title_id, {})
+        for title_id, entries in previous.items()
+        for relative in entries
+    )
+    manifest = {
+        "version": FINGERPRINT_VERSION,
+        "titles": {
+            title_id: dict(sorted(entries.items()))
+            for title_id, entries in sorted(titles.items())
+            if entries
+        },
+    }
+    tmp = manifest_path.with_name(f".{manifest_path.name}.tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=1)
+        fh.write("\n")
+    os.replace(tmp, manifest_path)
+    return FingerprintReport(
+        files=sum(len(entries) for entries in titles.values()),
+        hashed=len(pending),
+        removed=removed,
+        hashed_bytes=sum(stat.st_size for *_, stat in pending),
+    )
@@ -0,0 +1,126 @@
+"""Periodic housekeeping for tables that only ever grow (magic-link tokens, rate-limit hits)."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, delete, or_, select, text
+from sqlalchemy.engine import Engine
+
+from .database import SessionLocal, engine
+from .models import MagicLinkToken
+from .rate_limit import rate_limit_store
+from .settings import get_settings
+
+logger = logging.getLogger("uvicorn.error")
+settings = get_settings()
+
+
+def prune_magic_link_tokens(
+    retention: Optional[timedelta] = None, batch_size: Optional[int] = None
+) -> int:
+    """Delete tokens that expired or were used more than ``retention`` ago.
+
+    Rows are removed in chunks of ``batch_size``, each in its own short
+    transaction, so a large backlog never holds the SQLite write lock for long.
+    Returns the number of deleted rows.
+    """
+
+    retention = retention or timedelta(days=settings.magic_link_token_retention_days)
+    batch_size = batch_size or settings.token_maintenance_batch_size
+    cutoff = datetime.now(timezone.utc) - retention
+    prunable = or_(
+        MagicLinkToken.expires_at < cutoff,
+        and_(MagicLinkToken.used_at.is_not(None), MagicLinkToken.used_at < cutoff),
+    )
+
+    deleted = 0
+    with SessionLocal() as session:
+        while True:
+            batch = select(MagicLinkToken.id).where(prunable).limit(batch_size)
+            result = session.execute(
+                delete(MagicLinkToken)
+                .where(MagicLinkToken.id.in_(batch))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
+
+
+def optimize_database(vacuum: bool = False, bind: Engine = engine) -> None:
+    """Refresh planner statistics and optionally VACUUM; a no-op outside SQLite."""
+
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+        if vacuum:
+            conn.execute(text("VACUUM"))
+
+
+def prune_rate_limit_hits() -> int:
+    """Drop rate-limit hits older than the window; keys are unique per email and IP."""
+
+    return rate_limit_store.prune(
+        settings.magic_link_rate_limit_window_minutes * 60,
+        batch_size=settings.token_maintenance_batch_size,
+    )
+
+
+def run_maintenance(vacuum: bool = False) -> int:
+    deleted = prune_magic_link_tokens()
+    pruned_hits = prune_rate_limit_hits()
+    if pruned_hits:
+        logger.info("Pruned %d expired rate-limit hits", pruned_hits)
+    optimize_database(vacuum=vacuum)
+    return deleted
+
+
+class MaintenanceScheduler:
+    """Runs :func:`run_maintenance` on an interval from the app lifespan.
+
+    The work happens in a thread so batch deletes and VACUUM never block the
+    event loop.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._last_vacuum = time.monotonic()
+
+    def start(self) -> None:
+        if self._task is None and settings.token_maintenance_interval_minutes > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def _vacuum_due(self) -> bool:
+        interval = settings.sqlite_vacuum_interval_hours * 3600
+        return interval > 0 and time.monotonic() - self._last_vacuum >= interval
+
+    async def _run(self) -> None:
+        while True:
+            vacuum = self._vacuum_due()
+            try:
+                deleted = await asyncio.to_thread(run_maintenance, vacuum)
+            except Exception:  # pragma: no cover - keep the scheduler alive
+                logger.exception("Token maintenance failed")
+            else:
+                if vacuum:
+                    self._last_vacuum = time.monotonic()
+                if deleted:
+                    logger.info("Pruned %d magic link tokens", deleted)
+            await asyncio.sleep(settings.token_maintenance_interval_minutes * 60)
+
+
+maintenance_scheduler = MaintenanceScheduler()
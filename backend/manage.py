@@ -5,15 +5,17 @@ import argparse
 import sys
 
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
-from backend.catalog import CatalogConfigError, get_packages, normalize_package_ids
+from backend.catalog import CatalogConfigError, get_package_ids, normalize_package_ids
 from backend.database import SessionLocal
+from backend.dependencies import invalidate_entitlements
 from backend.models import User, UserPackage
 
 
 def _valid_package_ids() -> set[str]:
     try:
-        return {pkg.get("id") for pkg in get_packages() if pkg.get("id")}
+        return set(get_package_ids())
     except CatalogConfigError as exc:  # pragma: no cover - runtime validation
         raise SystemExit(f"Invalid catalog configuration: {exc}") from exc
 
@@ -32,7 +34,12 @@ def create_user(
         raise SystemExit("Unknown package ids: " + ", ".join(invalid))
 
     with SessionLocal() as session:
-        user = session.query(User).filter(User.email == email_norm).first()
+        user = (
+            session.query(User)
+            .options(selectinload(User.package_links))
+            .filter(User.email == email_norm)
+            .first()
+        )
         if user:
             user.full_access = full_access or user.full_access
             user.is_active = is_active
@@ -44,19 +51,27 @@ def create_user(
         for package_id in requested_packages:
             if package_id not in existing:
                 user.package_links.append(UserPackage(package_id=package_id))
+        user.bump_entitlement_version()
 
         try:
             session.commit()
         except IntegrityError as exc:
             session.rollback()
             raise SystemExit(f"Failed to upsert user {email_norm}: {exc}") from exc
+        invalidate_entitlements(user.id)
         session.refresh(user)
+        user.package_links  # load before the session closes so callers can print packages
         return user
 
 
 def list_users() -> list[User]:
     with SessionLocal() as session:
-        return session.query(User).order_by(User.id.asc()).all()
+        return (
+            session.query(User)
+            .options(selectinload(User.package_links))
+            .order_by(User.id.asc())
+            .all()
+        )
 
 
 def main(argv: list[str] | None = None) -> int:
@@ -80,6 +95,124 @@ def main(argv: list[str] | None = None) -> int:
 
     subparsers.add_parser("list-users", help="Print existing users")
 
+    prune_cmd = subparsers.add_parser(
+        "prune-tokens", help="Delete expired/used magic link tokens past the retention window"
+    )
+    prune_cmd.add_argument(
+        "--retention-days", type=int, default=None, help="Override MAGIC_LINK_TOKEN_RETENTION_DAYS"
+    )
+    prune_cmd.add_argument(
+        "--batch-size", type=int, default=None, help="Rows deleted per transaction"
+    )
+    prune_cmd.add_argument(
+        "--vacuum", action="store_true", help="Also VACUUM the SQLite database afterwards"
+    )
+
+    transcode_cmd = subparsers.add_parser(
+        "transcode", help="Encode catalog WAVs into compressed renditions with ffmpeg"
+    )
+    transcode_cmd.add_argument(
+        "--format",
+        action="append",
+        default=[],
+        help="Rendition to produce: opus or aac (repeat for several; default: all)",
+    )
+    transcode_cmd.add_argument(
+        "--title", action="append", default=[], help="Only transcode this title (repeatable)"
+    )
+    transcode_cmd.add_argument(
+        "--workers", type=int, default=None, help="Parallel ffmpeg processes (default: CPU count)"
+    )
+    transcode_cmd.add_argument(
+        "--force", action="store_true", help="Re-encode even when the content hash is unchanged"
+    )
+    transcode_cmd.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg executable to use")
+
+    bundle_cmd = subparsers.add_parser(
+        "build-bundles", help="Concatenate each title's sentences into one WAV per language"
+    )
+    bundle_cmd.add_argument(
+        "--title", action="append", default=[], help="Only bundle this title (repeatable)"
+    )
+    bundle_cmd.add_argument(
+        "--force", action="store_true", help="Rebuild even when the sentences are unchanged"
+    )
+
+    analyze_cmd = subparsers.add_parser(
+        "analyze-audio",
+        help="Measure durations, loudness, silence bounds and waveform peaks (needs numpy)",
+    )
+    analyze_cmd.add_argument(
+        "--title", action="append", default=[], help="Only analyse this title (repeatable)"
+    )
+    analyze_cmd.add_argument(
+        "--workers", type=int, default=None, help="Parallel processes (default: CPU count)"
+    )
+    analyze_cmd.add_argument("--peaks", type=int, default=48, help="Peak values per sentence")
+    analyze_cmd.add_argument(
+        "--silence-db", type=float, default=-45.0, help="Level below which audio counts as silence"
+    )
+
+    compile_cmd = subparsers.add_parser(
+        "compile-catalog",
+        help="Validate titles, packages, sentence lists and audio, then write the compiled catalog",
+    )
+    compile_cmd.add_argument(
+        "--allow-missing-media",
+        action="store_true",
+        help="Report missing sentence lists and audio files as warnings instead of errors",
+    )
+    compile_cmd.add_argument(
+        "--check", action="store_true", help="Only validate; do not write the artifact"
+    )
+    compile_cmd.add_argument(
+        "--workers", type=int, default=None, help="Parallel validation threads"
+    )
+
+    transcripts_cmd = subparsers.add_parser(
+        "index-transcripts",
+        help="Rebuild the full-text (SQLite FTS5) index of every sentence's text",
+    )
+    transcripts_cmd.add_argument(
+        "--title", action="append", default=[], help="Only index this title (repeatable)"
+    )
+    transcripts_cmd.add_argument(
+        "--output", default=None, help="Index file to write (default: TRANSCRIPT_INDEX_PATH)"
+    )
+
+    fingerprint_cmd = subparsers.add_parser(
+        "fingerprint-assets",
+        help="Hash every file under the media root for content-addressed, immutable URLs",
+    )
+    fingerprint_cmd.add_argument(
+        "--workers", type=int, default=None, help="Parallel hashing threads"
+    )
+    fingerprint_cmd.add_argument(
+        "--force", action="store_true", help="Re-hash files even when size and mtime are unchanged"
+    )
+
+    export_cmd = subparsers.add_parser(
+        "export-free-catalog",
+        help="Write the static free catalog used by the web pages when the API is unreachable",
+    )
+    export_cmd.add_argument(
+        "--output", default="audios-free.json", help="File to write (default: audios-free.json)"
+    )
+
+    bench_cmd = subparsers.add_parser(
+        "bench-sqlite", help="Compare SQLite read concurrency with default vs tuned pragmas"
+    )
+    bench_cmd.add_argument("--readers", type=int, default=4, help="Concurrent reader threads")
+    bench_cmd.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+
+    serialization_cmd = subparsers.add_parser(
+        "bench-serialization",
+        help="Compare the per-request CPU cost of /auth responses before and after the orjson switch",
+    )
+    serialization_cmd.add_argument(
+        "--requests", type=int, default=5000, help="Requests per route and variant"
+    )
+
     args = parser.parse_args(argv)
 
     if args.command == "create-user":
@@ -96,6 +229,116 @@ def main(argv: list[str] | None = None) -> int:
                 f"User #{user.id} · {user.email} · full_access={user.full_access} · is_active={user.is_active} · packages={packages}"
             )
         return 0
+    if args.command == "prune-tokens":
+        from datetime import timedelta
+
+        from backend.maintenance import optimize_database, prune_magic_link_tokens
+
+        retention = timedelta(days=args.retention_days) if args.retention_days is not None else None
+        deleted = prune_magic_link_tokens(retention, args.batch_size)
+        optimize_database(vacuum=args.vacuum)
+        print(f"Deleted {deleted} magic link tokens")
+        return 0
+    if args.command == "transcode":
+        from backend.transcode import RENDITION_FORMATS, TranscodeError, transcode_catalog
+
+        try:
+            report = transcode_catalog(
+                formats=args.format or tuple(RENDITION_FORMATS),
+                title_ids=args.title or None,
+                workers=args.workers,
+                force=args.force,
+                ffmpeg=args.ffmpeg,
+            )
+        except (TranscodeError, CatalogConfigError) as exc:
+            raise SystemExit(str(exc)) from exc
+        print(report.summary())
+        return 1 if report.failed else 0
+    if args.command == "build-bundles":
+        from backend.bundles import BundleError, build_bundles
+
+        try:
+            results, errors = build_bundles(args.title or None, force=args.force)
+        except (BundleError, CatalogConfigError) as exc:
+            raise SystemExit(str(exc)) from exc
+        for result in results:
+            state = "built" if result.rebuilt else "up to date"
+            print(
+                f"{result.title_id}/{result.lang}: {result.sentences} sentences · "
+                f"{result.bytes / 1024:.0f} KiB · {state}"
+            )
+        for error in errors:
+            print(f"skipped {error}", file=sys.stderr)
+        return 1 if errors else 0
+    if args.command == "analyze-audio":
+        from backend.analysis import AnalysisError, AnalysisParams, analyse_catalog
+
+        try:
+            report = analyse_catalog(
+                title_ids=args.title or None,
+                workers=args.workers,
+                params=AnalysisParams(peaks=args.peaks, silence_db=args.silence_db),
+            )
+        except (AnalysisError, CatalogConfigError) as exc:
+            raise SystemExit(str(exc)) from exc
+        print(report.summary())
+        return 1 if report.failed else 0
+    if args.command == "compile-catalog":
+        from backend.catalog import COMPILED_PATH
+        from backend.catalog_compiler import compile_catalog
+
+        report = compile_catalog(
+            allow_missing_media=args.allow_missing_media,
+            workers=args.workers,
+            output=None if args.check else COMPILED_PATH,
+        )
+        print(report.summary())
+        return 1 if report.errors else 0
+    if args.command == "index-transcripts":
+        from pathlib import Path
+
+        from backend.transcripts import TranscriptIndexError, build_transcript_index
+
+        try:
+            report = build_transcript_index(
+                args.title or None, Path(args.output) if args.output else None
+            )
+        except (TranscriptIndexError, CatalogConfigError) as exc:
+            raise SystemExit(str(exc)) from exc
+        print(report.summary())
+        return 0
+    if args.command == "fingerprint-assets":
+        from backend.fingerprints import fingerprint_assets
+
+        try:
+            report = fingerprint_assets(workers=args.workers, force=args.force)
+        except CatalogConfigError as exc:
+            raise SystemExit(str(exc)) from exc
+        print(report.summary())
+        return 0
+    if args.command == "export-free-catalog":
+        from pathlib import Path
+
+        from backend.catalog import export_free_catalog
+
+        try:
+            count = export_free_catalog(Path(args.output))
+        except CatalogConfigError as exc:
+            raise SystemExit(str(exc)) from exc
+        print(f"Wrote {count} free titles to {args.output}")
+        return 0
+    if args.command == "bench-sqlite":
+        from backend.benchmarks import run_sqlite_benchmark
+
+        for result in run_sqlite_benchmark(readers=args.readers, seconds=args.seconds):
+            print(result.summary())
+        return 0
+    if args.command == "bench-serialization":
+        from backend.benchmarks import run_serialization_benchmark
+
+        for result in run_serialization_benchmark(requests=args.requests):
+            print(result.summary())
+        return 0
     return 1
 
 
@@ -3,7 +3,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -23,6 +23,7 @@ class User(Base):
     email = Column(String, unique=True, nullable=False, index=True)
     full_access = Column(Boolean, nullable=False, default=False)
     is_active = Column(Boolean, nullable=False, default=True)
+    entitlement_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), default=_utcnow, nullable=False)
 
     magic_link_tokens = relationship(
@@ -32,30 +33,59 @@ class User(Base):
         "UserPackage", back_populates="user", cascade="all, delete-orphan"
     )
 
+    @property
+    def package_id_set(self) -> frozenset[str]:
+        """Owned package IDs, rebuilt only after ``bump_entitlement_version``.
+
+        Full-access users get the catalog's shared ID set instead of a copy.
+        """
+
+        if self.full_access:
+            try:
+                from .catalog import CatalogConfigError, get_package_ids
+
+                return get_package_ids()
+            except CatalogConfigError:
+                pass
+        version = self.entitlement_version or 0
+        cached = getattr(self, "_package_id_cache", None)
+        if cached is None or cached[0] != version:
+            cached = (version, frozenset(link.package_id for link in self.package_links))
+            self._package_id_cache = cached
+        return cached[1]
+
     @property
     def packages(self) -> list[str]:  # pragma: no cover - convenience proxy
         if self.full_access:
             try:
-                from .catalog import CatalogConfigError, get_packages
+                from .catalog import CatalogConfigError, get_catalog_index
 
-                return [pkg.get("id") for pkg in get_packages() if pkg.get("id")]
+                return list(get_catalog_index().packages_by_id)
             except CatalogConfigError:
                 pass
         return [link.package_id for link in self.package_links]
 
+    def bump_entitlement_version(self) -> None:
+        """Mark cached entitlements (JWT claims, in-memory snapshots) as stale."""
+
+        self.entitlement_version = (self.entitlement_version or 0) + 1
+
     def has_any_package(self) -> bool:
         return self.full_access or bool(self.package_links)
 
     def can_access_package(self, package_id: str) -> bool:
-        return self.full_access or package_id in self.packages
+        return self.full_access or package_id in self.package_id_set
 
 
 class MagicLinkToken(Base):
     __tablename__ = "magic_link_tokens"
+    __table_args__ = (
+        Index("ix_magic_link_tokens_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    token_hash = Column(String, nullable=False, index=True)
+    token_hash = Column(String, nullable=False, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), default=_utcnow, nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=False)
     used_at = Column(DateTime(timezone=True), nullable=True)
@@ -75,3 +105,22 @@ class UserPackage(Base):
     granted_at = Column(DateTime(timezone=True), default=_utcnow, nullable=False)
 
     user = relationship("User", back_populates="package_links")
+
+
+class PayPalNotification(Base):
+    """Raw PayPal IPN as received, so it can be verified and applied exactly once."""
+
+    __tablename__ = "paypal_notifications"
+
+    id = Column(Integer, primary_key=True)
+    # "<txn_id>:<payment_status>"; PayPal re-sends the same pair on retries but
+    # reuses txn_id across status changes (e.g. Pending -> Completed). Only set
+    # once PayPal has verified the notification.
+    dedupe_key = Column(String, unique=True, nullable=True)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime(timezone=True), default=_utcnow, nullable=False)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,152 @@
+"""Pre-serialized JSON bodies with compressed variants and ETag handling."""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:  # pragma: no cover - optional dependency
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:  # pragma: no cover - optional dependency
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+# Response class of every route; ORJSONResponse needs orjson at render time.
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+@dataclass(frozen=True)
+class EncodedPayload:
+    """A response body serialized once, plus its compressed variants."""
+
+    body: bytes
+    etag: str
+    gzip_body: Optional[bytes] = None
+    brotli_body: Optional[bytes] = None
+
+    def variant(self, encoding: str) -> Optional[bytes]:
+        if encoding == "br":
+            return self.brotli_body
+        if encoding == "gzip":
+            return self.gzip_body
+        return self.body
+
+
+def dump_json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compute_etag(parts: Iterable[bytes]) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()[:32]
+
+
+def encode_payload(body: bytes, etag: Optional[str] = None) -> EncodedPayload:
+    """Compress ``body`` with gzip (and brotli when installed) and fingerprint it."""
+
+    gzip_body: Optional[bytes] = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(gzip_body) >= len(body):
+        gzip_body = None
+    brotli_body: Optional[bytes] = None
+    if brotli is not None:
+        brotli_body = brotli.compress(body, quality=11)
+        if len(brotli_body) >= len(body):
+            brotli_body = None
+    return EncodedPayload(
+        body=body,
+        etag=etag or compute_etag([body]),
+        gzip_body=gzip_body,
+        brotli_body=brotli_body,
+    )
+
+
+def encode_json_payload(data: Any) -> EncodedPayload:
+    return encode_payload(dump_json(data))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Return True when any entity tag in ``If-None-Match`` refers to ``etag``.
+
+    Representation suffixes (``-gzip``/``-br``) are ignored because every
+    variant of the same body is equally fresh for the client.
+    """
+
+    if not if_none_match:
+        return False
+    for raw in if_none_match.split(","):
+        tag = raw.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        for suffix in ("-gzip", "-br"):
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)]
+                break
+        if tag == etag:
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding: Optional[str], payload: EncodedPayload) -> str:
+    """Pick the best stored variant the client accepts (``br`` > ``gzip`` > identity)."""
+
+    if not accept_encoding:
+        return "identity"
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0 and payload.variant(encoding) is not None:
+            return encoding
+    return "identity"
+
+
+def payload_response(
+    request: Request,
+    payload: EncodedPayload,
+    cache_control: str = "no-cache",
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Serve ``payload`` as-is, answering matching ``If-None-Match`` with 304."""
+
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        headers["ETag"] = f'"{payload.etag}"'
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), payload)
+    if encoding == "identity":
+        headers["ETag"] = f'"{payload.etag}"'
+    else:
+        headers["ETag"] = f'"{payload.etag}-{encoding}"'
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=payload.variant(encoding), media_type=JSON_MEDIA_TYPE, headers=headers
+    )
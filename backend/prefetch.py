@@ -0,0 +1,165 @@
+"""Offline prefetch manifests: every asset a package or title needs, in download order.
+
+A service worker warms its cache from the manifest in one background pass
+instead of stalling between sentences on a patchy connection. For each title
+there is first a small ``index`` group (sentence lists and offset tables),
+then one group per language holding that language's audio in playback order.
+Each language group names the ``audio`` format it actually lists: the requested
+rendition or bundle when the language has it, otherwise the source WAVs.
+The assets of one group can be fetched in parallel. Each asset carries its
+byte size and, once ``manage.py fingerprint-assets`` has run, its content
+hash and hashed ``path``. Paths are relative to ``/media/``, which checks the
+caller's entitlement for every asset. ``format`` is the manifest layout and
+``catalog_version`` the catalog ``VERSION`` it was built from, so a client can
+tell when its warm cache is stale. Manifests are cached per catalog version and
+sentence-list signature.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .alignment import build_aligned_manifest, title_languages
+from .catalog import CatalogConfigError, CatalogIndex, hashed_name, media_root, sentence_file
+from .payloads import EncodedPayload, encode_json_payload
+
+PREFETCH_FORMAT = 4
+# Every listed path is served, entitlement-checked, under this API prefix.
+MEDIA_BASE = "/media/"
+# "wav" keeps the source files, "bundle" one bundle.wav per language; others are renditions.
+AUDIO_CHOICES = ("wav", "bundle", "opus", "aac")
+_CACHE_SIZE = 128
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[Any, ...], Tuple[Tuple[Tuple[int, int], ...], EncodedPayload]]" = OrderedDict()
+
+
+def _asset(
+    title_dir: Path, title_id: str, relative: str, fingerprints: Dict[str, Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    """Size, hash and URL path (relative to ``MEDIA_BASE``) of one file, or None if absent."""
+
+    entry = fingerprints.get(relative)
+    if entry is not None:
+        return {
+            "path": f"{title_id}/{hashed_name(relative, entry['hash'])}",
+            "bytes": entry["size"],
+            "hash": entry["hash"],
+        }
+    try:
+        size = (title_dir / relative).stat().st_size
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return {"path": f"{title_id}/{relative}", "bytes": size, "hash": None}
+
+
+def _group(
+    title_id: str, lang: Optional[str], audio: Optional[str], assets: List[Optional[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    present = [asset for asset in assets if asset is not None]
+    return {
+        "title_id": title_id,
+        "lang": lang,
+        "audio": audio,
+        "bytes": sum(asset["bytes"] for asset in present),
+        "assets": present,
+    }
+
+
+def _title_groups(
+    index: CatalogIndex, title_id: str, langs: Optional[Sequence[str]], audio: str
+) -> List[Dict[str, Any]]:
+    title_dir = media_root() / title_id
+    available = title_languages(index.titles[title_id])
+    selected = available if langs is None else [lang for lang in langs if lang in available]
+    selected = [lang for lang in selected if (title_dir / f"{lang}-{title_id}.json").exists()]
+    if not selected:
+        return []
+    fingerprints = index.assets.get(title_id, {})
+    manifest = build_aligned_manifest(title_id, selected)
+
+    metadata = []
+    for lang in selected:
+        metadata.append(_asset(title_dir, title_id, f"{lang}-{title_id}.json", fingerprints))
+        if audio == "bundle":
+            metadata.append(_asset(title_dir, title_id, f"{lang}-{title_id}.offsets.json", fingerprints))
+    groups = [_group(title_id, None, None, metadata)]
+
+    for lang in selected:
+        bundle = _asset(title_dir, title_id, f"{lang}/bundle.wav", fingerprints) if audio == "bundle" else None
+        if bundle is not None:
+            groups.append(_group(title_id, lang, "bundle", [bundle]))
+            continue
+        files = [sentence_file(file) for file in manifest["file"][lang] if file]
+        actual = "wav"
+        if audio in index.title_renditions.get(title_id, {}).get(lang, []):
+            extension = index.rendition_formats[audio].get("ext", audio)
+            files = [str(Path(file).with_suffix(f".{extension}").as_posix()) for file in files]
+            actual = audio
+        groups.append(
+            _group(title_id, lang, actual, [_asset(title_dir, title_id, file, fingerprints) for file in files])
+        )
+    return groups
+
+
+def _lists_signature(title_ids: Sequence[str], index: CatalogIndex) -> Tuple[Tuple[int, int], ...]:
+    root = media_root()
+    signature = []
+    for title_id in title_ids:
+        for lang in title_languages(index.titles[title_id]):
+            try:
+                stat = (root / title_id / f"{lang}-{title_id}.json").stat()
+            except FileNotFoundError:
+                signature.append((-1, -1))
+            else:
+                signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def get_prefetch_payload(
+    index: CatalogIndex,
+    scope: str,
+    title_ids: Sequence[str],
+    langs: Optional[Sequence[str]] = None,
+    audio: str = "wav",
+) -> EncodedPayload:
+    """Serialized prefetch manifest of ``title_ids`` (already authorized), cached.
+
+    ``scope`` (e.g. ``package:pkg-a1``) only labels the cache entry and the response.
+    """
+
+    files_signature = _lists_signature(title_ids, index)
+    selected = tuple(langs) if langs is not None else None
+    key = (index.signature, index.version, scope, selected, audio)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == files_signature:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    groups: List[Dict[str, Any]] = []
+    try:
+        for title_id in title_ids:
+            groups.extend(_title_groups(index, title_id, langs, audio))
+    except (ValueError, KeyError, TypeError) as exc:
+        raise CatalogConfigError(f"Invalid sentence list: {exc}") from exc
+    payload = encode_json_payload(
+        {
+            "format": PREFETCH_FORMAT,
+            "catalog_version": index.version,
+            "scope": scope,
+            "audio": audio,
+            "base": MEDIA_BASE,
+            "assets": sum(len(group["assets"]) for group in groups),
+            "bytes": sum(group["bytes"] for group in groups),
+            "groups": groups,
+        }
+    )
+    with _cache_lock:
+        _cache[key] = (files_signature, payload)
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return payload
@@ -0,0 +1,227 @@
+"""Sliding-window rate limiting for unauthenticated endpoints.
+
+Two stores share one interface: an in-process store for single-worker
+deployments and a SQLite-file store that several uvicorn workers on the same
+host can share. Both record a hit only when every rule allows it, so a request
+rejected by its IP limit does not eat into the email's quota.
+"""
+from __future__ import annotations
+
+import ipaddress
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Deque, Optional, Protocol, Sequence, Tuple, Union
+
+from fastapi import Request
+
+from .settings import get_settings
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    key: str
+    limit: int
+    window_seconds: float
+
+
+class RateLimitStore(Protocol):
+    # True when ``hit`` does blocking I/O and must run off the event loop.
+    blocking: bool
+
+    def hit(self, rules: Sequence[RateLimitRule]) -> Optional[float]:
+        """Record one hit for every rule, or return seconds to wait if any is exhausted."""
+
+    def prune(self, older_than_seconds: float, batch_size: int = 500) -> int:
+        """Forget hits older than every window; returns how many were dropped."""
+
+
+class MemoryRateLimitStore:
+    """Per-key timestamp logs kept in an LRU-bounded dict."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._hits: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    def hit(self, rules: Sequence[RateLimitRule]) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            retry_after: Optional[float] = None
+            for rule in rules:
+                hits = self._hits.get(rule.key)
+                if hits is None:
+                    continue
+                cutoff = now - rule.window_seconds
+                while hits and hits[0] <= cutoff:
+                    hits.popleft()
+                if len(hits) >= rule.limit:
+                    wait = hits[0] + rule.window_seconds - now if hits else rule.window_seconds
+                    retry_after = max(retry_after or 0.0, wait)
+            if retry_after is not None:
+                return retry_after
+
+            for rule in rules:
+                hits = self._hits.get(rule.key)
+                if hits is None:
+                    hits = self._hits[rule.key] = deque()
+                hits.append(now)
+                self._hits.move_to_end(rule.key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+        return None
+
+    def prune(self, older_than_seconds: float, batch_size: int = 500) -> int:
+        cutoff = time.monotonic() - older_than_seconds
+        with self._lock:
+            stale = [key for key, hits in self._hits.items() if not hits or hits[-1] <= cutoff]
+            dropped = sum(len(self._hits.pop(key)) for key in stale)
+        return dropped
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hits.clear()
+
+
+class SQLiteRateLimitStore:
+    """Timestamp log in a small SQLite file shared by every worker on the host.
+
+    Each hit takes the file's write lock (waiting up to 5 s), so async callers
+    run ``hit`` in a worker thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_hits (key TEXT NOT NULL, ts REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_rate_limit_hits_key_ts ON rate_limit_hits (key, ts)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, rules: Sequence[RateLimitRule]) -> Optional[float]:
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            retry_after: Optional[float] = None
+            for rule in rules:
+                cutoff = now - rule.window_seconds
+                conn.execute(
+                    "DELETE FROM rate_limit_hits WHERE key = ? AND ts <= ?", (rule.key, cutoff)
+                )
+                count, oldest = conn.execute(
+                    "SELECT COUNT(*), MIN(ts) FROM rate_limit_hits WHERE key = ?", (rule.key,)
+                ).fetchone()
+                if count >= rule.limit:
+                    wait = oldest + rule.window_seconds - now if count else rule.window_seconds
+                    retry_after = max(retry_after or 0.0, wait)
+            if retry_after is None:
+                conn.executemany(
+                    "INSERT INTO rate_limit_hits (key, ts) VALUES (?, ?)",
+                    [(rule.key, now) for rule in rules],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def prune(self, older_than_seconds: float, batch_size: int = 500) -> int:
+        """Delete expired hits of every key in short batches, so writers are never held up long."""
+
+        cutoff = time.time() - older_than_seconds
+        conn = self._connection()
+        deleted = 0
+        while True:
+            cursor = conn.execute(
+                "DELETE FROM rate_limit_hits WHERE rowid IN "
+                "(SELECT rowid FROM rate_limit_hits WHERE ts <= ? LIMIT ?)",
+                (cutoff, batch_size),
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+
+
+def _build_store() -> RateLimitStore:
+    if settings.rate_limit_backend == "sqlite":
+        return SQLiteRateLimitStore(Path(settings.rate_limit_sqlite_path))
+    return MemoryRateLimitStore()
+
+
+rate_limit_store: RateLimitStore = _build_store()
+
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+@lru_cache(maxsize=1)
+def _trusted_networks(proxies: Tuple[str, ...]) -> Tuple[IPNetwork, ...]:
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _is_trusted(host: str, networks: Tuple[IPNetwork, ...]) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """The caller's IP: the peer address, or X-Forwarded-For when the peer is a trusted proxy.
+
+    The header is read right to left and the first address that is not itself
+    a trusted proxy wins, so a client cannot spoof its IP by sending the header.
+    """
+
+    peer = request.client.host if request.client else None
+    networks = _trusted_networks(tuple(settings.trusted_proxies))
+    if peer is None or not networks or not _is_trusted(peer, networks):
+        return peer
+    forwarded = [
+        host.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for host in header.split(",")
+        if host.strip()
+    ]
+    for host in reversed(forwarded):
+        if not _is_trusted(host, networks):
+            return host
+    return forwarded[0] if forwarded else peer
+
+
+def magic_link_rules(email: str, client_ip: Optional[str]) -> list[RateLimitRule]:
+    window = settings.magic_link_rate_limit_window_minutes * 60
+    rules = [
+        RateLimitRule(f"magic-link:email:{email}", settings.magic_link_rate_limit_max_requests, window)
+    ]
+    if client_ip:
+        rules.append(
+            RateLimitRule(
+                f"magic-link:ip:{client_ip}", settings.magic_link_ip_rate_limit_max_requests, window
+            )
+        )
+    return rules
@@ -1,20 +1,28 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 from typing import Literal, Optional
 from urllib.parse import urlencode, urlparse
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi.responses import JSONResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import RedirectResponse
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from ..database import get_db
+from ..database import execute_write, get_db
 from ..dependencies import get_current_user
-from ..email_utils import send_magic_link_email
+from ..entitlements import Entitlements
+from ..email_utils import dispatch_magic_link_email
 from ..models import MagicLinkToken, User
+from ..payloads import DefaultJSONResponse
+from ..rate_limit import client_ip, magic_link_rules, rate_limit_store
 from ..schemas import (
     GenericDetailResponse,
     MagicLinkRequest,
     MagicLoginResponse,
     UserRead,
+    magic_login_payload,
+    user_payload,
 )
 from ..security import create_access_token, generate_magic_raw_token, hash_token
 from ..settings import get_settings
@@ -28,43 +36,45 @@ _GENERIC_RESPONSE = GenericDetailResponse(
 
 
 @router.post("/magic-link/request", response_model=GenericDetailResponse)
-def request_magic_link(
-    payload: MagicLinkRequest, request: Request, db: Session = Depends(get_db)
+async def request_magic_link(
+    payload: MagicLinkRequest, request: Request, db: AsyncSession = Depends(get_db)
 ) -> GenericDetailResponse:
     email_norm = payload.email.strip().lower()
+    ip = client_ip(request)
+    await _enforce_rate_limit(email_norm, ip)
 
-    user = (
-        db.query(User)
-        .filter(
+    result = await db.execute(
+        select(User)
+        .options(selectinload(User.package_links))
+        .where(
             User.email == email_norm,
             User.is_active.is_(True),
         )
-        .first()
     )
+    user = result.scalar_one_or_none()
 
     if not user or not user.has_any_package():
         return _GENERIC_RESPONSE
 
-    _enforce_rate_limit(db, user)
-
     raw_token = generate_magic_raw_token()
     token_hash = hash_token(raw_token)
     expires_at = datetime.now(timezone.utc) + timedelta(
         minutes=settings.magic_link_expiration_minutes
     )
 
-    magic_link_token = MagicLinkToken(
-        user_id=user.id,
-        token_hash=token_hash,
-        expires_at=expires_at,
-        created_ip=request.client.host if request.client else None,
-        created_user_agent=request.headers.get("user-agent"),
+    await execute_write(
+        db,
+        insert(MagicLinkToken).values(
+            user_id=user.id,
+            token_hash=token_hash,
+            expires_at=expires_at,
+            created_ip=ip,
+            created_user_agent=request.headers.get("user-agent"),
+        ),
     )
-    db.add(magic_link_token)
-    db.commit()
 
     magic_link_url = _build_magic_link_url(raw_token)
-    send_magic_link_email(user.email, magic_link_url, raw_token)
+    await dispatch_magic_link_email(user.email, magic_link_url, raw_token)
 
     return _GENERIC_RESPONSE
 
@@ -74,7 +84,7 @@ def request_magic_link(
     response_model=MagicLoginResponse,
     responses={307: {"description": "Redirect with HttpOnly cookie"}},
 )
-def magic_login(
+async def magic_login(
     token: str = Query(..., description="Raw magic link token"),
     request: Request = None,
     response_mode: Literal["json", "cookie"] = Query(
@@ -84,14 +94,15 @@ def magic_login(
         None,
         description="Override redirect target when using response_mode=cookie.",
     ),
-    db: Session = Depends(get_db),
-) -> MagicLoginResponse:
+    db: AsyncSession = Depends(get_db),
+) -> Response:
     token_hash = hash_token(token)
     now = datetime.now(timezone.utc)
 
-    magic_link_token = (
-        db.query(MagicLinkToken).filter(MagicLinkToken.token_hash == token_hash).first()
+    result = await db.execute(
+        select(MagicLinkToken).where(MagicLinkToken.token_hash == token_hash)
     )
+    magic_link_token = result.scalar_one_or_none()
 
     if not magic_link_token:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
@@ -103,11 +114,12 @@ def magic_login(
     if expires_at < now:
         raise HTTPException(status_code=400, detail="Token expired")
 
-    user = (
-        db.query(User)
-        .filter(User.id == magic_link_token.user_id, User.is_active.is_(True))
-        .first()
+    result = await db.execute(
+        select(User)
+        .options(selectinload(User.package_links))
+        .where(User.id == magic_link_token.user_id, User.is_active.is_(True))
     )
+    user = result.scalar_one_or_none()
 
     if not user:
         raise HTTPException(status_code=403, detail="User not allowed")
@@ -128,30 +140,35 @@ def magic_login(
     if settings.block_suspicious_login_attempts and ip_differs and ua_differs:
         raise HTTPException(status_code=400, detail="Suspicious login attempt")
 
-    magic_link_token.used_at = now
-    db.add(magic_link_token)
-    db.commit()
+    # Conditional on used_at so two concurrent logins cannot both redeem the token.
+    redeemed = await execute_write(
+        db,
+        update(MagicLinkToken)
+        .where(MagicLinkToken.id == magic_link_token.id, MagicLinkToken.used_at.is_(None))
+        .values(used_at=now),
+    )
+    if redeemed != 1:
+        raise HTTPException(status_code=400, detail="Token already used")
 
-    access_token = create_access_token({"sub": str(user.id)})
+    access_token = create_access_token(
+        {"sub": str(user.id)}, entitlements=Entitlements.from_user(user)
+    )
 
     if response_mode == "cookie":
         return _build_cookie_response(access_token, redirect_to, request)
 
-    return MagicLoginResponse(
-        access_token=access_token,
-        token_type="bearer",
-        user=user,
-    )
+    # response_model only documents the shape; returning a Response skips re-validating the ORM object.
+    return DefaultJSONResponse(magic_login_payload(access_token, user))
 
 
 @router.get("/me", response_model=UserRead)
-def read_current_user(current_user: User = Depends(get_current_user)) -> User:
-    return current_user
+async def read_current_user(current_user: User = Depends(get_current_user)) -> Response:
+    return DefaultJSONResponse(user_payload(current_user))
 
 
 @router.post("/logout", response_model=GenericDetailResponse)
-def logout(request: Request) -> JSONResponse:
-    response = JSONResponse({"detail": "Sessió tancada"})
+def logout(request: Request) -> Response:
+    response = DefaultJSONResponse({"detail": "Sessió tancada"})
     response.delete_cookie(
         key=settings.auth_cookie_name,
         **_cookie_kwargs(request),
@@ -159,31 +176,26 @@ def logout(request: Request) -> JSONResponse:
     return response
 
 
-def _enforce_rate_limit(db: Session, user: User) -> None:
-    window_start = datetime.now(timezone.utc) - timedelta(
-        minutes=settings.magic_link_rate_limit_window_minutes
-    )
-    recent_attempts = (
-        db.query(MagicLinkToken)
-        .filter(
-            MagicLinkToken.user_id == user.id,
-            MagicLinkToken.created_at >= window_start,
-        )
-        .count()
-    )
-    if recent_attempts >= settings.magic_link_rate_limit_max_requests:
+async def _enforce_rate_limit(email: str, ip: Optional[str]) -> None:
+    """Throttle per email and per client IP before touching the database."""
+
+    rules = magic_link_rules(email, ip)
+    if rate_limit_store.blocking:
+        retry_after = await asyncio.to_thread(rate_limit_store.hit, rules)
+    else:
+        retry_after = rate_limit_store.hit(rules)
+    if retry_after is not None:
         raise HTTPException(
             status_code=429,
             detail="Too many magic link requests. Please try again later.",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
         )
 
 
 def _extract_request_fingerprint(request: Optional[Request]) -> tuple[Optional[str], Optional[str]]:
     if not request:
         return None, None
-    ip = request.client.host if request.client else None
-    user_agent = request.headers.get("user-agent")
-    return ip, user_agent
+    return client_ip(request), request.headers.get("user-agent")
 
 
 def _build_cookie_response(
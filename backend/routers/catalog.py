@@ -1,13 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from typing import Any, Dict, List, Optional
 
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..alignment import get_aligned_payload, requested_languages
 from ..catalog import (
     CatalogConfigError,
-    build_catalog_for_package_id,
-    build_catalog_response,
-    get_free_package_definition,
+    CatalogIndex,
+    get_catalog_index,
+    get_changes_payload,
+    get_free_catalog_payload,
+    get_library_payload,
+    get_package_payload,
+)
+from ..catalog_search import project
+from ..database import get_db
+from ..dependencies import (
+    confirm_entitlements,
+    get_current_entitlements,
+    get_optional_entitlements,
+    refresh_entitlements,
 )
-from ..dependencies import get_current_user
-from ..models import User
+from ..entitlements import Entitlements
+from ..payloads import payload_response
+from ..prefetch import AUDIO_CHOICES, get_prefetch_payload
+from ..transcripts import TranscriptIndexError, transcript_searcher
 
 router = APIRouter(prefix="/catalog", tags=["catalog"])
 
@@ -23,27 +41,289 @@ def _handle_catalog_error(exc: CatalogConfigError) -> HTTPException:
 
 
 @router.get("/free")
-def get_free_catalog() -> dict:
+async def get_free_catalog(request: Request) -> Response:
     try:
-        package = get_free_package_definition()
-        return build_catalog_response(package)
+        payload = get_free_catalog_payload()
     except CatalogConfigError as exc:  # pragma: no cover - runtime validation
         raise _handle_catalog_error(exc) from exc
+    return payload_response(request, payload, cache_control="public, no-cache")
 
 
 @router.get("/packages/{package_id}")
-def get_package_catalog(
-    package_id: str, current_user: User = Depends(get_current_user)
-) -> dict:
+async def get_package_catalog(
+    package_id: str,
+    request: Request,
+    entitlements: Entitlements = Depends(get_current_entitlements),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
     try:
-        catalog = build_catalog_for_package_id(package_id)
+        payload = get_package_payload(package_id)
     except CatalogConfigError as exc:  # pragma: no cover - runtime validation
         raise _handle_catalog_error(exc) from exc
 
-    if not current_user.can_access_package(package_id):
+    if not entitlements.can_access_package(package_id):
+        # Claims can predate a purchase; confirm against the database before refusing.
+        entitlements = await refresh_entitlements(db, entitlements)
+    if not entitlements.can_access_package(package_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Subscription required",
         )
 
-    return catalog
+    return payload_response(request, payload, cache_control="private, no-cache")
+
+
+@router.get("/library")
+async def get_library_catalog(
+    request: Request,
+    entitlements: Entitlements = Depends(get_current_entitlements),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    """Free catalog plus every package the caller owns, merged in one response."""
+
+    # Nothing is denied here, so confirm a token or cache snapshot is not older than a purchase.
+    entitlements = await confirm_entitlements(db, entitlements)
+    try:
+        payload = get_library_payload(entitlements.packages)
+    except CatalogConfigError as exc:  # pragma: no cover - runtime validation
+        raise _handle_catalog_error(exc) from exc
+    return payload_response(request, payload, cache_control="private, no-cache")
+
+
+@router.get("/changes")
+async def get_catalog_changes(
+    request: Request,
+    since: int = Query(..., ge=0, description="VERSION of the catalog the client already holds"),
+    entitlements: Optional[Entitlements] = Depends(get_optional_entitlements),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    """Titles added, changed or removed in the caller's library since ``since``.
+
+    Anonymous callers get the delta of the free catalog. ``resync: true`` means
+    the history no longer covers ``since`` and the library must be fetched again.
+    """
+
+    if entitlements is not None:
+        entitlements = await confirm_entitlements(db, entitlements)
+    package_ids = entitlements.packages if entitlements is not None else []
+    try:
+        payload = get_changes_payload(since, package_ids)
+    except CatalogConfigError as exc:  # pragma: no cover - runtime validation
+        raise _handle_catalog_error(exc) from exc
+    return payload_response(
+        request,
+        payload,
+        cache_control="public, no-cache" if entitlements is None else "private, no-cache",
+    )
+
+
+def _visible_mask(index: CatalogIndex, entitlements: Optional[Entitlements]) -> int:
+    """Titles the caller may see: the free package, plus owned packages when signed in."""
+
+    search = index.search
+    if entitlements is not None and entitlements.full_access:
+        return search.all_mask
+    visible = [index.free_package["id"]] if index.free_package else []
+    if entitlements is not None:
+        visible.extend(entitlements.packages)
+    return search.packages_mask(visible)
+
+
+@router.get("/search")
+async def search_catalog(
+    response: Response,
+    level: List[str] = Query([], description="CEFR level; repeat to match any of several"),
+    lang: List[str] = Query([], description="Language code; repeat to require all of them"),
+    ages: List[str] = Query([], description='Age band as written in the catalog, e.g. "10-16"'),
+    age: Optional[int] = Query(None, ge=0, le=150, description="Titles whose age band includes it"),
+    collection: List[str] = Query([], description="Collection; repeat to match any"),
+    package: List[str] = Query([], description="Package ID; repeat to match any"),
+    q: Optional[str] = Query(None, max_length=100, description="Words in the title or description"),
+    fields: Optional[str] = Query(None, description="Comma-separated title fields to return"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    entitlements: Optional[Entitlements] = Depends(get_optional_entitlements),
+) -> Dict[str, Any]:
+    """Filter the caller's library (the free catalog when anonymous) by facets and words.
+
+    Values of one facet are alternatives, except ``lang`` where every language
+    must be available; different facets are combined with AND. ``facets``
+    counts every value within the filtered result.
+    """
+
+    try:
+        index = get_catalog_index()
+    except CatalogConfigError as exc:  # pragma: no cover - runtime validation
+        raise _handle_catalog_error(exc) from exc
+    search = index.search
+
+    mask = _visible_mask(index, entitlements)
+    if package:
+        mask &= search.packages_mask(package)
+    mask &= search.mask_for("level", level)
+    mask &= search.mask_for("lang", lang, match_all=True)
+    mask &= search.mask_for("ages", ages)
+    mask &= search.mask_for("collection", collection)
+    if age is not None:
+        mask &= search.age_mask(age)
+    if q and q.strip():
+        mask = search.text_mask(q, mask)
+
+    projection = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+    response.headers["Cache-Control"] = (
+        "public, no-cache" if entitlements is None else "private, no-cache"
+    )
+    return {
+        "total": mask.bit_count(),
+        "offset": offset,
+        "limit": limit,
+        "items": [
+            project(title_id, index.titles[title_id], projection)
+            for title_id in search.page(mask, offset, limit)
+        ],
+        "facets": search.facet_counts(mask),
+    }
+
+
+@router.get("/transcripts/search")
+async def search_transcripts(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find (accent-insensitive)"),
+    lang: List[str] = Query([], description="Only search these languages"),
+    title: List[str] = Query([], description="Only search these titles"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    entitlements: Optional[Entitlements] = Depends(get_optional_entitlements),
+) -> Dict[str, Any]:
+    """Sentence hits (title, language, ``n``, text) within the titles the caller may see."""
+
+    try:
+        index = get_catalog_index()
+    except CatalogConfigError as exc:  # pragma: no cover - runtime validation
+        raise _handle_catalog_error(exc) from exc
+
+    title_ids: Optional[List[str]] = None
+    if title or entitlements is None or not entitlements.full_access:
+        mask = _visible_mask(index, entitlements)
+        if title:
+            mask &= index.search.titles_mask(title)
+        title_ids = index.search.page(mask, 0, mask.bit_count())
+    try:
+        result = await asyncio.to_thread(
+            transcript_searcher.search, q, title_ids, lang, offset, limit
+        )
+    except TranscriptIndexError as exc:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)) from exc
+
+    response.headers["Cache-Control"] = (
+        "public, no-cache" if entitlements is None else "private, no-cache"
+    )
+    return {"offset": offset, "limit": limit, **result}
+
+
+@router.get("/titles/{title_id}/aligned")
+async def get_aligned_title(
+    title_id: str,
+    request: Request,
+    langs: Optional[str] = Query(None, description="Comma-separated languages, e.g. CA,EN"),
+    entitlements: Optional[Entitlements] = Depends(get_optional_entitlements),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    """Sentences of ``langs`` aligned by ``n`` in columns: one request opens a title."""
+
+    try:
+        index = get_catalog_index()
+    except CatalogConfigError as exc:  # pragma: no cover - runtime validation
+        raise _handle_catalog_error(exc) from exc
+    title = index.titles.get(title_id)
+    if title is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Title not found")
+
+    is_free = title_id in index.free_title_ids
+    if not is_free:
+        if entitlements is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        package_ids = index.title_packages.get(title_id, frozenset())
+        if not entitlements.can_access_any(package_ids):
+            # Claims can predate a purchase; confirm against the database before refusing.
+            entitlements = await refresh_entitlements(db, entitlements)
+        if not entitlements.can_access_any(package_ids):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Subscription required")
+
+    selected, unknown = requested_languages(title, langs)
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Languages not available: {', '.join(unknown)}" if unknown else "No languages",
+        )
+    try:
+        payload = await asyncio.to_thread(get_aligned_payload, index, title_id, selected)
+    except FileNotFoundError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Sentence list not found"
+        ) from exc
+    except CatalogConfigError as exc:
+        raise _handle_catalog_error(exc) from exc
+    return payload_response(
+        request, payload, cache_control="public, no-cache" if is_free else "private, no-cache"
+    )
+
+
+@router.get("/prefetch")
+async def get_prefetch_manifest(
+    request: Request,
+    package: Optional[str] = Query(None, description="Package to prefetch"),
+    title: Optional[str] = Query(None, description="Single title to prefetch"),
+    langs: Optional[str] = Query(None, description="Comma-separated languages (default: all)"),
+    audio: str = Query("wav", description=f"Audio to list: {', '.join(AUDIO_CHOICES)}"),
+    entitlements: Entitlements = Depends(get_current_entitlements),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    """Ordered, grouped asset list of an owned package or title for offline pre-caching."""
+
+    if (package is None) == (title is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Pass exactly one of package or title",
+        )
+    if audio not in AUDIO_CHOICES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"audio must be one of: {', '.join(AUDIO_CHOICES)}",
+        )
+    try:
+        index = get_catalog_index()
+    except CatalogConfigError as exc:  # pragma: no cover - runtime validation
+        raise _handle_catalog_error(exc) from exc
+
+    if package is not None:
+        definition = index.packages_by_id.get(package)
+        if definition is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Package not found")
+        package_ids = frozenset({package})
+        scope = f"package:{package}"
+        title_ids = [title_id for title_id in definition.get("title_ids", []) if title_id in index.titles]
+    else:
+        if title not in index.titles:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Title not found")
+        package_ids = index.title_packages.get(title, frozenset())
+        scope = f"title:{title}"
+        title_ids = [title]
+
+    is_free = (title or "") in index.free_title_ids or (
+        index.free_package is not None and package == index.free_package.get("id")
+    )
+    if not is_free and not entitlements.can_access_any(package_ids):
+        # Claims can predate a purchase; confirm against the database before refusing.
+        entitlements = await refresh_entitlements(db, entitlements)
+    if not is_free and not entitlements.can_access_any(package_ids):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Subscription required")
+
+    wanted = [lang.strip().upper() for lang in langs.split(",") if lang.strip()] if langs else None
+    try:
+        payload = await asyncio.to_thread(
+            get_prefetch_payload, index, scope, title_ids, wanted, audio
+        )
+    except CatalogConfigError as exc:
+        raise _handle_catalog_error(exc) from exc
+    return payload_response(request, payload, cache_control="private, no-cache")
@@ -0,0 +1,293 @@
+"""Entitlement-checked audio and sentence lists with HTTP range and conditional request support."""
+import mimetypes
+import mmap
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+
+from ..catalog import CatalogConfigError, get_catalog_index, media_root
+from ..database import get_db
+from ..dependencies import get_current_entitlements, oauth2_scheme, refresh_entitlements
+from ..payloads import etag_matches
+from ..settings import get_settings
+
+router = APIRouter(prefix="/media", tags=["media"])
+settings = get_settings()
+
+MEDIA_ROOT = media_root()
+
+_LANG_RE = re.compile(r"^[A-Za-z]{2,3}$")
+# "0001.wav", or its content-hashed name "0001.<16 hex>.wav" from manage.py fingerprint-assets.
+_SEGMENT_RE = re.compile(r"^([\w-]+)(?:\.([0-9a-f]{16}))?\.(wav|mp3|m4a|aac|ogg|opus|webm)$")
+# Title-level sentence lists and offset tables: "CA-<title>.json", "CA-<title>.offsets.json".
+_TITLE_ASSET_RE = re.compile(r"^([A-Za-z]{2,3}-[\w.-]+?)(?:\.([0-9a-f]{16}))?\.(json)$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$", re.IGNORECASE)
+
+
+class FileSegmentResponse(Response):
+    """Send bytes ``start..end`` (inclusive) of ``path`` without reading the file into memory.
+
+    Servers that implement the ASGI ``http.response.zerocopysend`` extension
+    get the open file and push it with ``sendfile``; otherwise the file is
+    memory-mapped and sent in ``MEDIA_CHUNK_SIZE`` slices.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: Dict[str, str],
+        media_type: str,
+        send_body: bool = True,
+    ) -> None:
+        self.path = path
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.media_type = media_type
+        self.send_body = send_body
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers}
+        )
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with self.path.open("rb") as fh:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": fh,
+                        "offset": self.start,
+                        "count": count,
+                    }
+                )
+                return
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                position, stop = self.start, self.end + 1
+                while position < stop:
+                    chunk_end = min(position + settings.media_chunk_size, stop)
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": mapped[position:chunk_end],
+                            "more_body": chunk_end < stop,
+                        }
+                    )
+                    position = chunk_end
+
+
+async def _authorize(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials],
+    db: AsyncSession,
+    package_ids: FrozenSet[str],
+) -> None:
+    entitlements = await get_current_entitlements(request, credentials, db)
+    if not entitlements.can_access_any(package_ids):
+        # Claims can predate a purchase; confirm against the database before refusing.
+        entitlements = await refresh_entitlements(db, entitlements)
+    if not entitlements.can_access_any(package_ids):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Subscription required")
+
+
+def _split_name(name: str, pattern: "re.Pattern[str]") -> Tuple[str, Optional[str]]:
+    """Return the on-disk file name plus the content hash embedded in ``name``, if any."""
+
+    match = pattern.match(name)
+    if match is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Segment not found")
+    stem, digest, extension = match.groups()
+    return f"{stem}.{extension}", digest
+
+
+def _asset_path(title_id: str, relative: str) -> Path:
+    if "/" in title_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Segment not found")
+    path = MEDIA_ROOT / title_id / relative
+    if os.path.commonpath([MEDIA_ROOT, path.resolve()]) != str(MEDIA_ROOT):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Segment not found")
+    return path
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive byte range of a single-range header, or None to ignore it.
+
+    Multi-range and malformed headers are ignored (the full file is sent);
+    ranges that start past the end of the file raise 416.
+    """
+
+    match = _RANGE_RE.match(header.strip())
+    if match is None or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if end < start and start < size:
+            return None
+    else:
+        suffix = int(last)
+        # "bytes=-0" asks for nothing and can never be satisfied.
+        start, end = (max(0, size - suffix) if suffix else size), size - 1
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+
+def _requested_range(
+    request: Request, etag: str, last_modified: str, size: int
+) -> Optional[Tuple[int, int]]:
+    range_header = request.headers.get("range")
+    if not range_header:
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() not in (f'"{etag}"', last_modified):
+        # The client's partial copy is stale; send the whole current file.
+        return None
+    return _parse_range(range_header, size)
+
+
+@router.api_route("/{title_id}/{lang}/{segment}", methods=["GET", "HEAD"])
+async def stream_segment(
+    title_id: str,
+    lang: str,
+    segment: str,
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    """Serve one audio segment; titles outside the free package need an entitlement."""
+
+    if not _LANG_RE.match(lang):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Segment not found")
+    name, digest = _split_name(segment, _SEGMENT_RE)
+    return await _serve_asset(request, credentials, db, title_id, f"{lang}/{name}", digest)
+
+
+@router.api_route("/{title_id}/{asset}", methods=["GET", "HEAD"])
+async def stream_title_asset(
+    title_id: str,
+    asset: str,
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    """Serve a sentence list or offset table, with the same access rules as the audio."""
+
+    name, digest = _split_name(asset, _TITLE_ASSET_RE)
+    return await _serve_asset(request, credentials, db, title_id, name, digest)
+
+
+async def _serve_asset(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials],
+    db: AsyncSession,
+    title_id: str,
+    relative: str,
+    digest: Optional[str],
+) -> Response:
+    try:
+        index = get_catalog_index()
+    except CatalogConfigError as exc:  # pragma: no cover - runtime validation
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc)
+        ) from exc
+    if title_id not in index.titles:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Title not found")
+
+    is_free = title_id in index.free_title_ids
+    if not is_free:
+        await _authorize(request, credentials, db, index.title_packages.get(title_id, frozenset()))
+
+    fingerprint = index.assets.get(title_id, {}).get(relative)
+    if digest is not None and (fingerprint is None or fingerprint["hash"] != digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Segment not found")
+    path = _asset_path(title_id, relative)
+    try:
+        stat = path.stat()
+    except (FileNotFoundError, NotADirectoryError) as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Segment not found") from exc
+
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    scope = "public" if is_free else "private"
+    cache_control = f"{scope}, max-age={settings.media_cache_max_age_seconds}"
+    if (
+        digest is not None
+        and fingerprint["size"] == stat.st_size
+        and fingerprint["mtime_ns"] == stat.st_mtime_ns
+    ):
+        # The file is still the one that was hashed, so this URL can never change.
+        cache_control = f"{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+
+    if settings.media_x_accel_redirect:
+        # nginx serves the file itself, including Range, ETag and Last-Modified.
+        location = f"{settings.media_x_accel_prefix.rstrip('/')}/{quote(title_id)}/{relative}"
+        return Response(
+            media_type=media_type,
+            headers={"X-Accel-Redirect": location, "Cache-Control": cache_control},
+        )
+
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "ETag": f'"{etag}"',
+        "Last-Modified": last_modified,
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = _requested_range(request, etag, last_modified, stat.st_size)
+    if byte_range is None:
+        start, end, status_code = 0, stat.st_size - 1, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return FileSegmentResponse(
+        path,
+        start,
+        end,
+        status_code,
+        headers,
+        media_type,
+        send_body=request.method != "HEAD",
+    )
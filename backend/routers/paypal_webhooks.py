@@ -1,72 +1,354 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
 from urllib.parse import parse_qs
 
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from ..catalog import normalize_package_ids
-from ..database import get_db
-from ..models import User, UserPackage
+from ..database import AsyncSessionLocal, get_db
+from ..dependencies import invalidate_entitlements
+from ..models import PayPalNotification, User, UserPackage
 from ..settings import get_settings
 
 router = APIRouter(prefix="/webhooks/paypal", tags=["paypal"])
 settings = get_settings()
+logger = logging.getLogger("uvicorn.error")
+
+# A notification stuck in "processing" this long was claimed by a worker that died.
+_STALE_CLAIM = timedelta(minutes=10)
+
+
+class IPNProcessor:
+    """Pooled PayPal HTTP client plus the optional accept-then-verify worker.
+
+    Started and stopped by the app lifespan. With ``PAYPAL_IPN_DEFERRED`` the
+    webhook only stores the raw notification; worker tasks verify it with
+    PayPal and grant packages, retrying transport errors with backoff.
+    """
+
+    def __init__(self) -> None:
+        self.client: Optional[httpx.AsyncClient] = None
+        self._queue: Optional["asyncio.Queue[int]"] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def deferred(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        self.client = httpx.AsyncClient(
+            timeout=settings.paypal_http_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.paypal_http_max_connections,
+                max_keepalive_connections=settings.paypal_http_max_connections,
+                keepalive_expiry=settings.paypal_http_keepalive_seconds,
+            ),
+        )
+        if not settings.paypal_ipn_deferred:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._run()) for _ in range(max(1, settings.paypal_ipn_workers))
+        ]
+        for notification_id in await _recoverable_notification_ids():
+            self._queue.put_nowait(notification_id)
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def submit(self, notification_id: int, delay: float = 0.0) -> None:
+        if self._queue is None:
+            return
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, notification_id)
+        else:
+            self._queue.put_nowait(notification_id)
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        while True:
+            notification_id = await self._queue.get()
+            try:
+                await self._process(notification_id)
+            except Exception:  # pragma: no cover - keep the worker alive
+                logger.exception("Failed to process PayPal notification %s", notification_id)
+
+    async def _process(self, notification_id: int) -> None:
+        async with AsyncSessionLocal() as db:
+            notification = await _claim_notification(db, notification_id)
+            if notification is None:
+                return
+            try:
+                verified = await _verify_ipn_status(notification.payload.encode()) == "VERIFIED"
+            except httpx.HTTPError as exc:
+                await self._retry_later(db, notification, exc)
+                return
+
+            if not verified:
+                notification.status = "invalid"
+                notification.processed_at = datetime.now(timezone.utc)
+                await db.commit()
+                return
+            ipn = _parse_ipn(notification.payload.encode())
+            dedupe_key = _dedupe_key(ipn)
+            if await _is_duplicate(db, dedupe_key):
+                await _mark_duplicate(db, notification)
+                return
+            # Only a verified IPN holds the dedupe key, so a forged one cannot block the real one.
+            notification.dedupe_key = dedupe_key
+            try:
+                await _apply_notification(db, notification, ipn)
+            except Exception as exc:
+                await db.rollback()
+                await db.refresh(notification)
+                if isinstance(exc, IntegrityError) and await _is_duplicate(db, dedupe_key):
+                    # Another worker applied the same txn/status pair in the meantime.
+                    await _mark_duplicate(db, notification)
+                    return
+                await self._retry_later(db, notification, exc)
+
+    async def _retry_later(
+        self, db: AsyncSession, notification: PayPalNotification, exc: Exception
+    ) -> None:
+        """Put ``notification`` back in the queue with backoff, or fail it after the last attempt."""
+
+        notification.last_error = str(exc) or exc.__class__.__name__
+        if notification.attempts >= settings.paypal_ipn_max_attempts:
+            notification.status = "failed"
+            logger.error(
+                "Giving up on PayPal notification %s: %s", notification.id, exc, exc_info=exc
+            )
+        else:
+            notification.status = "pending"
+            logger.warning(
+                "PayPal notification %s failed (attempt %s), retrying: %s",
+                notification.id,
+                notification.attempts,
+                exc,
+            )
+            self.submit(
+                notification.id,
+                delay=settings.paypal_ipn_retry_backoff_seconds * 2 ** (notification.attempts - 1),
+            )
+        await db.commit()
+
+
+ipn_processor = IPNProcessor()
+
+
+async def _verify_ipn_status(payload: bytes) -> str:
+    """Post the IPN back to PayPal and return its verdict; raises on transport errors."""
+
+    client = ipn_processor.client
+    owned = client is None
+    if owned:
+        client = httpx.AsyncClient(timeout=settings.paypal_http_timeout_seconds)
+    try:
+        resp = await client.post(
+            settings.paypal_ipn_verify_url,
+            content=b"cmd=_notify-validate&" + payload,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+    finally:
+        if owned:
+            await client.aclose()
+    if resp.status_code != status.HTTP_200_OK:
+        raise httpx.HTTPStatusError(
+            f"PayPal verification returned {resp.status_code}", request=resp.request, response=resp
+        )
+    return resp.text.strip()
 
 
 async def _verify_ipn(payload: bytes) -> bool:
     """Send the raw IPN payload back to PayPal to validate authenticity."""
 
-    verify_url = settings.paypal_ipn_verify_url
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(
-                verify_url,
-                content=b"cmd=_notify-validate&" + payload,
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
+        return await _verify_ipn_status(payload) == "VERIFIED"
     except httpx.HTTPError:
         return False
 
-    return resp.status_code == status.HTTP_200_OK and resp.text.strip() == "VERIFIED"
+
+def _parse_ipn(payload: bytes) -> dict:
+    params = parse_qs(payload.decode())
+    raw_packages = (params.get("custom") or [""])[0]
+    return {
+        "payer_email": (params.get("payer_email") or [""])[0].strip().lower(),
+        "payment_status": (params.get("payment_status") or [""])[0].strip().lower(),
+        "txn_id": (params.get("txn_id") or [""])[0].strip(),
+        "package_ids": normalize_package_ids(
+            [pkg.strip() for pkg in raw_packages.split(",") if pkg.strip()]
+        ),
+    }
+
+
+def _dedupe_key(ipn: dict) -> Optional[str]:
+    if not ipn["txn_id"]:
+        return None
+    return f"{ipn['txn_id']}:{ipn['payment_status']}"
+
+
+async def _is_duplicate(db: AsyncSession, dedupe_key: Optional[str]) -> bool:
+    """True once a verified notification with this txn/status has been applied."""
+
+    if dedupe_key is None:
+        return False
+    existing = await db.scalar(
+        select(PayPalNotification.id).where(
+            PayPalNotification.dedupe_key == dedupe_key,
+            PayPalNotification.status == "processed",
+        )
+    )
+    return existing is not None
+
+
+async def _mark_duplicate(db: AsyncSession, notification: PayPalNotification) -> None:
+    notification.status = "duplicate"
+    notification.processed_at = datetime.now(timezone.utc)
+    await db.commit()
 
 
 @router.post("")
-async def paypal_ipn(request: Request, db: Session = Depends(get_db)) -> dict:
+async def paypal_ipn(request: Request, db: AsyncSession = Depends(get_db)) -> dict:
     payload = await request.body()
     if not payload:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty IPN body")
 
+    ipn = _parse_ipn(payload)
+    dedupe_key = _dedupe_key(ipn)
+    if await _is_duplicate(db, dedupe_key):
+        return {"ok": True}
+
+    if ipn_processor.deferred:
+        # Unverified: the dedupe key is only set once PayPal confirms the notification.
+        notification = PayPalNotification(payload=payload.decode())
+        db.add(notification)
+        await db.commit()
+        ipn_processor.submit(notification.id)
+        return {"ok": True}
+
     if not await _verify_ipn(payload):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid PayPal IPN")
 
-    params = parse_qs(payload.decode())
-    payer_email = (params.get("payer_email") or [""])[0].strip().lower()
-    payment_status = (params.get("payment_status") or [""])[0].strip().lower()
-    raw_packages = (params.get("custom") or [""])[0]
-    package_ids = normalize_package_ids(
-        [pkg.strip() for pkg in raw_packages.split(",") if pkg.strip()]
+    notification = PayPalNotification(
+        dedupe_key=dedupe_key, payload=payload.decode(), status="processing", attempts=1
     )
+    db.add(notification)
+    try:
+        await _apply_notification(db, notification, ipn)
+    except IntegrityError:
+        await db.rollback()
+        # Only a concurrent copy of this txn/status is harmless; otherwise let PayPal retry.
+        if not await _is_duplicate(db, dedupe_key):
+            raise
+    return {"ok": True}
 
-    if payment_status == "completed" and payer_email and package_ids:
-        _grant_user_packages(db, payer_email, package_ids)
 
-    return {"ok": True}
+async def _apply_notification(
+    db: AsyncSession, notification: PayPalNotification, ipn: dict
+) -> None:
+    """Mark ``notification`` processed and grant its packages in one commit."""
+
+    notification.status = "processed"
+    notification.processed_at = datetime.now(timezone.utc)
+    if ipn["payment_status"] == "completed" and ipn["payer_email"] and ipn["package_ids"]:
+        await _grant_user_packages(db, ipn["payer_email"], ipn["package_ids"])
+    else:
+        await db.commit()
 
 
-def _grant_user_packages(db: Session, email: str, package_ids: list[str]) -> User:
+async def _claim_notification(
+    db: AsyncSession, notification_id: int
+) -> Optional[PayPalNotification]:
+    result = await db.execute(
+        update(PayPalNotification)
+        .where(
+            PayPalNotification.id == notification_id,
+            PayPalNotification.status == "pending",
+        )
+        .values(
+            status="processing",
+            claimed_at=datetime.now(timezone.utc),
+            attempts=PayPalNotification.attempts + 1,
+        )
+    )
+    await db.commit()
+    if result.rowcount != 1:
+        return None
+    return await db.get(PayPalNotification, notification_id)
+
+
+async def _recoverable_notification_ids() -> Tuple[int, ...]:
+    """Pending notifications plus ones abandoned mid-processing (e.g. after a crash)."""
+
+    stale_before = datetime.now(timezone.utc) - _STALE_CLAIM
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(PayPalNotification)
+            .where(
+                PayPalNotification.status == "processing",
+                or_(
+                    PayPalNotification.claimed_at.is_(None),
+                    PayPalNotification.claimed_at < stale_before,
+                ),
+            )
+            .values(status="pending")
+        )
+        await db.commit()
+        result = await db.scalars(
+            select(PayPalNotification.id)
+            .where(PayPalNotification.status == "pending")
+            .order_by(PayPalNotification.id)
+        )
+        return tuple(result)
+
+
+async def _grant_user_packages(db: AsyncSession, email: str, package_ids: list[str]) -> User:
     email_norm = email.strip().lower()
-    user = db.query(User).filter(User.email == email_norm).first()
+    query = select(User).options(selectinload(User.package_links)).where(User.email == email_norm)
+    user = (await db.execute(query)).scalar_one_or_none()
     if not user:
-        user = User(email=email_norm, full_access=False, is_active=True)
-        db.add(user)
-        db.flush()
+        await _create_user(email_norm)
+        user = (await db.execute(query)).scalar_one()
 
     existing = set(user.packages)
     new_links = [pkg for pkg in package_ids if pkg not in existing]
     for package_id in new_links:
         user.package_links.append(UserPackage(package_id=package_id))
 
+    if new_links or not user.is_active:
+        user.bump_entitlement_version()
     user.is_active = True
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    invalidate_entitlements(user.id)
     return user
+
+
+async def _create_user(email: str) -> None:
+    """Insert a user for ``email`` in its own transaction, tolerating a concurrent insert.
+
+    Two IPNs for a new buyer can race on ``users.email``; the loser must still
+    grant its packages to the user the winner created.
+    """
+
+    async with AsyncSessionLocal() as db:
+        db.add(User(email=email, full_access=False, is_active=True))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
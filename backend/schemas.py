@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from pydantic import BaseModel, EmailStr
 
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from .models import User
+
 
 class MagicLinkRequest(BaseModel):
     email: EmailStr
@@ -30,6 +33,23 @@ class MagicLoginResponse(BaseModel):
     user: UserRead
 
 
+def user_payload(user: "User") -> Dict[str, Any]:
+    """``UserRead`` as a plain dict, built straight from the ORM object without validation."""
+
+    return {
+        "id": user.id,
+        "email": user.email,
+        "full_access": user.full_access,
+        "packages": user.packages,
+    }
+
+
+def magic_login_payload(access_token: str, user: "User") -> Dict[str, Any]:
+    """``MagicLoginResponse`` as a plain dict."""
+
+    return {"access_token": access_token, "token_type": "bearer", "user": user_payload(user)}
+
+
 class MagicLinkTokenRead(BaseModel):
     id: str
     user_id: int
@@ -5,6 +5,7 @@ from typing import Any, Dict, Optional
 
 from jose import jwt
 
+from .entitlements import CLAIM_KEY, Entitlements
 from .settings import get_settings
 
 settings = get_settings()
@@ -18,11 +19,16 @@ def hash_token(raw_token: str) -> str:
     return hashlib.sha256(raw_token.encode("utf-8")).hexdigest()
 
 
-def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(
+    data: Dict[str, Any],
+    expires_delta: Optional[timedelta] = None,
+    entitlements: Optional[Entitlements] = None,
+) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (
-        expires_delta or timedelta(minutes=settings.jwt_expiration_minutes)
-    )
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=settings.jwt_expiration_minutes))
     to_encode.update({"exp": expire})
+    if entitlements is not None and settings.jwt_embed_entitlements:
+        to_encode.update({"iat": now, CLAIM_KEY: entitlements.to_claim()})
     encoded_jwt = jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
     return encoded_jwt
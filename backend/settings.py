@@ -1,8 +1,9 @@
+import ipaddress
 import json
 from functools import lru_cache
 from typing import List, Optional
 
-from pydantic import AnyUrl, BaseSettings, Field
+from pydantic import AnyUrl, BaseSettings, Field, validator
 
 
 DEFAULT_ALLOWED_REDIRECT_HOSTS = ["audiovook.com", "localhost", "127.0.0.1"]
@@ -20,20 +21,101 @@ class Settings(BaseSettings):
         "sqlite:///./audiovook.db",
         description="SQLAlchemy database URL. Defaults to local SQLite for development.",
     )
+    async_database_url: Optional[str] = Field(
+        None,
+        description="Async SQLAlchemy URL used by request handlers. Derived from database_url (aiosqlite/asyncpg) when unset.",
+    )
+    db_pool_size: int = Field(5, description="Persistent connections kept per engine (ignored for in-memory SQLite).")
+    db_max_overflow: int = Field(10, description="Extra connections allowed above db_pool_size under load.")
+    db_pool_pre_ping: bool = Field(
+        True, description="Test pooled connections before use so dropped connections are replaced transparently."
+    )
+    db_pool_recycle_seconds: int = Field(
+        1800, description="Recycle pooled connections older than this many seconds (-1 disables)."
+    )
+    sqlite_journal_mode: str = Field(
+        "WAL", description="SQLite journal_mode pragma; WAL lets readers proceed while a writer commits."
+    )
+    sqlite_synchronous: str = Field(
+        "NORMAL", description="SQLite synchronous pragma; NORMAL is durable across app crashes in WAL mode."
+    )
+    sqlite_busy_timeout_ms: int = Field(
+        5000, description="How long SQLite waits on a locked database before raising."
+    )
+    sqlite_mmap_size: int = Field(
+        256 * 1024 * 1024, description="Bytes of the SQLite file to memory-map for reads (0 disables)."
+    )
+    sqlite_cache_size: int = Field(
+        -64000, description="SQLite cache_size pragma; negative values are KiB, positive values pages."
+    )
+    sqlite_group_commit: bool = Field(
+        False,
+        description="Funnel magic-link token writes through one writer thread that commits them in groups.",
+    )
+    sqlite_group_commit_max_delay_ms: float = Field(
+        3.0, description="How long the group-commit writer waits for more writes before committing."
+    )
+    sqlite_group_commit_max_batch: int = Field(
+        64, description="Maximum number of writes committed together."
+    )
     jwt_secret_key: str = Field(..., description="Secret key used to sign JWT access tokens.")
     jwt_algorithm: str = Field("HS256", description="JWT signing algorithm.")
     jwt_expiration_minutes: int = Field(
         60 * 24, description="Number of minutes a standard access token remains valid."
     )
+    jwt_embed_entitlements: bool = Field(
+        False,
+        description="If true, access tokens carry a compact entitlement claim so catalog routes can skip the user lookup.",
+    )
+    jwt_entitlement_max_age_minutes: int = Field(
+        15,
+        description="Age after which an embedded entitlement claim is considered stale and the database is consulted again.",
+    )
+    entitlement_cache_size: int = Field(
+        4096, description="Maximum number of users whose entitlements are cached in memory (0 disables the cache)."
+    )
+    entitlement_cache_ttl_seconds: int = Field(
+        300, description="Maximum lifetime of a cached entitlement snapshot."
+    )
+    entitlement_cache_revalidate_seconds: int = Field(
+        5,
+        description="Age after which a cached snapshot is confirmed against users.entitlement_version before reuse.",
+    )
     magic_link_expiration_minutes: int = Field(
         15, description="Magic link validity period in minutes."
     )
+    magic_link_token_retention_days: int = Field(
+        7, description="Days expired or used magic link tokens are kept before being pruned."
+    )
+    token_maintenance_interval_minutes: int = Field(
+        60, description="How often the background job prunes tokens and refreshes SQLite statistics (0 disables)."
+    )
+    token_maintenance_batch_size: int = Field(
+        500, description="Rows deleted per transaction while pruning tokens."
+    )
+    sqlite_vacuum_interval_hours: int = Field(
+        24, description="Minimum hours between VACUUM runs of the maintenance job (0 disables VACUUM)."
+    )
     magic_link_rate_limit_window_minutes: int = Field(
         60, description="Window (in minutes) used to evaluate per-email rate limits."
     )
     magic_link_rate_limit_max_requests: int = Field(
         5, description="Maximum number of magic links a user can request within the configured window."
     )
+    magic_link_ip_rate_limit_max_requests: int = Field(
+        20, description="Maximum number of magic links a single client IP can request within the configured window."
+    )
+    rate_limit_backend: str = Field(
+        "memory",
+        description="Rate-limit store: 'memory' (per process) or 'sqlite' (shared by every worker on the host).",
+    )
+    rate_limit_sqlite_path: str = Field(
+        "./rate_limits.sqlite3", description="File used by the SQLite rate-limit store."
+    )
+    trusted_proxies: List[str] = Field(
+        default_factory=list,
+        description="Proxy addresses or CIDR ranges whose X-Forwarded-For header names the real client IP.",
+    )
     frontend_magic_login_url: AnyUrl = Field(
         "https://dual.local/auth/magic-login",
         description="Base URL where users land when clicking on a magic link.",
@@ -46,6 +128,24 @@ class Settings(BaseSettings):
         "https://ipnpb.paypal.com/cgi-bin/webscr",
         description="PayPal IPN validation endpoint used to confirm notifications.",
     )
+    paypal_ipn_deferred: bool = Field(
+        False,
+        description="Store IPNs and answer 200 immediately, verifying and granting packages in a background worker.",
+    )
+    paypal_ipn_workers: int = Field(2, description="Background tasks processing deferred IPNs.")
+    paypal_ipn_max_attempts: int = Field(
+        8, description="Verification attempts for a deferred IPN before it is marked failed."
+    )
+    paypal_ipn_retry_backoff_seconds: float = Field(
+        5.0, description="Initial delay before re-verifying a deferred IPN; doubles after every attempt."
+    )
+    paypal_http_timeout_seconds: float = Field(10.0, description="Timeout for PayPal verification requests.")
+    paypal_http_max_connections: int = Field(
+        10, description="Connections kept in the shared PayPal HTTP client pool."
+    )
+    paypal_http_keepalive_seconds: float = Field(
+        30.0, description="How long idle PayPal connections are kept alive for reuse."
+    )
     email_from_address: str = Field(
         "no-reply@audiovook.com", description="Sender email used for transactional emails."
     )
@@ -58,6 +158,27 @@ class Settings(BaseSettings):
     smtp_password: Optional[str] = None
     smtp_port: int = 587
     smtp_use_tls: bool = True
+    smtp_timeout_seconds: float = Field(10.0, description="Socket timeout for SMTP operations.")
+    smtp_max_idle_seconds: float = Field(
+        60.0, description="Close pooled SMTP connections that have been idle for longer than this."
+    )
+    email_queue_enabled: bool = Field(
+        True,
+        description="Deliver email from a background queue so requests return as soon as the token is stored.",
+    )
+    email_queue_max_size: int = Field(
+        1000, description="Maximum number of emails waiting for delivery; extra emails are logged and dropped."
+    )
+    email_queue_workers: int = Field(
+        1, description="Delivery threads, each holding one persistent SMTP connection."
+    )
+    email_max_attempts: int = Field(4, description="Delivery attempts per email before giving up.")
+    email_retry_backoff_seconds: float = Field(
+        1.0, description="Initial retry delay; doubles after every failed attempt."
+    )
+    email_queue_drain_seconds: float = Field(
+        10.0, description="How long shutdown waits for queued emails to be delivered."
+    )
     enforce_magic_link_ip_match: bool = Field(
         False,
         description="If true, the backend will reject magic link consumption when the IP does not match the original request.",
@@ -79,6 +200,33 @@ class Settings(BaseSettings):
     auth_cookie_samesite: str = Field(
         "lax", description="SameSite mode for the authentication cookie (lax/strict/none)."
     )
+    media_root: Optional[str] = Field(
+        None, description="Directory holding <title>/<LANG>/*.wav audio; defaults to the repo's AUDIOS folder."
+    )
+    media_x_accel_redirect: bool = Field(
+        False,
+        description="Authorize /media requests in the backend but let nginx send the file via X-Accel-Redirect.",
+    )
+    media_x_accel_prefix: str = Field(
+        "/_protected_audio/", description="Internal nginx location that maps onto MEDIA_ROOT."
+    )
+    media_cache_max_age_seconds: int = Field(
+        86400, description="max-age sent with audio segments served from /media."
+    )
+    media_chunk_size: int = Field(
+        256 * 1024, description="Bytes per body chunk when the server cannot sendfile."
+    )
+    transcript_index_path: str = Field(
+        "./transcripts.sqlite3",
+        description="SQLite FTS5 file written by manage.py index-transcripts and read by transcript search.",
+    )
+    catalog_history_path: str = Field(
+        "./catalog_history.json",
+        description="Shared file holding the catalog version and the per-title change history for /catalog/changes.",
+    )
+    catalog_history_size: int = Field(
+        50, description="Number of catalog versions whose changes are kept for delta sync."
+    )
     allowed_redirect_hosts: List[str] = Field(
         default_factory=lambda: DEFAULT_ALLOWED_REDIRECT_HOSTS.copy(),
         description="List of hostnames that are allowed as redirect targets when issuing HttpOnly cookie responses.",
@@ -88,6 +236,11 @@ class Settings(BaseSettings):
         description="Origins that may call the API with credentials for catalog and auth requests.",
     )
 
+    @validator("trusted_proxies", each_item=True)
+    def _check_proxy(cls, value: str) -> str:
+        ipaddress.ip_network(value, strict=False)  # ValueError -> settings error at startup
+        return value
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -118,6 +271,8 @@ class Settings(BaseSettings):
                 return cls._parse_list(raw_value, DEFAULT_ALLOWED_REDIRECT_HOSTS)
             if field_name == "allowed_cors_origins":
                 return cls._parse_list(raw_value, DEFAULT_ALLOWED_CORS_ORIGINS)
+            if field_name == "trusted_proxies":
+                return cls._parse_list(raw_value, [])
             return super().parse_env_var(field_name, raw_value)
 
 
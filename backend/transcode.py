@@ -0,0 +1,266 @@
+"""Compressed renditions of the catalog's WAV segments, encoded with a local ffmpeg.
+
+Renditions are written next to their source (``CA/0001.wav`` ->
+``CA/0001.opus``/``CA/0001.m4a``) so ``/media`` serves them with the same
+entitlement checks. ``catalog/renditions.json`` records the SHA-256 of every
+source and the encoder settings used; a later run only re-encodes files whose
+content or settings changed. The catalog exposes the manifest as ``RENDITIONS``.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .bundles import BUNDLE_NAME
+from .catalog import RENDITIONS_PATH, get_catalog_index, media_root
+
+
+class TranscodeError(RuntimeError):
+    """Raised when the transcoding pipeline cannot run at all."""
+
+
+@dataclass(frozen=True)
+class RenditionFormat:
+    name: str
+    extension: str
+    mime: str
+    ffmpeg_args: Tuple[str, ...]
+
+    @property
+    def fingerprint(self) -> str:
+        return " ".join(self.ffmpeg_args)
+
+    def describe(self) -> Dict[str, str]:
+        return {"ext": self.extension, "mime": self.mime}
+
+
+# Speech-tuned bitrates: mono sentences stay intelligible well below music rates.
+RENDITION_FORMATS: Dict[str, RenditionFormat] = {
+    "opus": RenditionFormat(
+        name="opus",
+        extension="opus",
+        mime='audio/ogg; codecs="opus"',
+        ffmpeg_args=("-ac", "1", "-c:a", "libopus", "-b:a", "32k", "-application", "voip"),
+    ),
+    "aac": RenditionFormat(
+        name="aac",
+        extension="m4a",
+        mime='audio/mp4; codecs="mp4a.40.2"',
+        ffmpeg_args=("-ac", "1", "-c:a", "aac", "-b:a", "48k", "-movflags", "+faststart"),
+    ),
+}
+
+# The temporary file name hides the extension, so the muxer is named explicitly.
+_FFMPEG_MUXERS = {"opus": "ogg", "m4a": "mp4"}
+
+
+@dataclass(frozen=True)
+class TranscodeJob:
+    title_id: str
+    relative: str
+    source: str
+    formats: Tuple[str, ...]
+    cached: Dict[str, Any]
+    ffmpeg: str
+    force: bool = False
+
+
+@dataclass
+class TranscodeReport:
+    encoded: int = 0
+    cached: int = 0
+    failed: List[str] = field(default_factory=list)
+    source_bytes: int = 0
+    rendition_bytes: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        lines = [
+            f"encoded={self.encoded} cached={self.cached} failed={len(self.failed)} "
+            f"source={self.source_bytes / 1024:.0f} KiB"
+        ]
+        for name, size in sorted(self.rendition_bytes.items()):
+            ratio = self.source_bytes / size if size else 0.0
+            lines.append(f"  {name:<5} {size / 1024:>8.0f} KiB  ({ratio:.1f}x smaller)")
+        lines.extend(f"  failed: {item}" for item in self.failed)
+        return "\n".join(lines)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _rendition_path(source: Path, fmt: RenditionFormat) -> Path:
+    return source.with_suffix(f".{fmt.extension}")
+
+
+def _is_fresh(entry: Dict[str, Any], sha256: str, source: Path, fmt: RenditionFormat) -> bool:
+    rendition = entry.get(fmt.name)
+    return (
+        entry.get("sha256") == sha256
+        and isinstance(rendition, dict)
+        and rendition.get("settings") == fmt.fingerprint
+        and _rendition_path(source, fmt).exists()
+    )
+
+
+def _encode(ffmpeg: str, source: Path, target: Path, fmt: RenditionFormat) -> None:
+    tmp = target.with_name(f".{target.name}.tmp")
+    command = [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y", "-i", str(source)]
+    command += [*fmt.ffmpeg_args, "-f", _FFMPEG_MUXERS[fmt.extension], str(tmp)]
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+        os.replace(tmp, target)
+    except subprocess.CalledProcessError as exc:
+        tmp.unlink(missing_ok=True)
+        raise TranscodeError(exc.stderr.decode("utf-8", "replace").strip() or str(exc)) from exc
+
+
+def _run_job(job: TranscodeJob) -> Tuple[TranscodeJob, Dict[str, Any], bool, Optional[str]]:
+    """Hash and (re-)encode one source; runs in a worker process."""
+
+    source = Path(job.source)
+    sha256 = _sha256(source)
+    entry: Dict[str, Any] = {"sha256": sha256, "bytes": source.stat().st_size}
+    encoded = False
+    try:
+        for name in job.formats:
+            fmt = RENDITION_FORMATS[name]
+            target = _rendition_path(source, fmt)
+            if job.force or not _is_fresh(job.cached, sha256, source, fmt):
+                _encode(job.ffmpeg, source, target, fmt)
+                encoded = True
+            entry[name] = {
+                "file": str(Path(job.relative).with_suffix(f".{fmt.extension}").as_posix()),
+                "bytes": target.stat().st_size,
+                "settings": fmt.fingerprint,
+            }
+    except (TranscodeError, OSError) as exc:
+        return job, entry, encoded, str(exc)
+    for name, fmt in RENDITION_FORMATS.items():
+        # Keep renditions from earlier runs with other --format selections.
+        if name not in job.formats and _is_fresh(job.cached, sha256, source, fmt):
+            entry[name] = job.cached[name]
+    return job, entry, encoded, None
+
+
+def load_manifest(path: Path = RENDITIONS_PATH) -> Dict[str, Any]:
+    if not path.exists():
+        return {"formats": {}, "titles": {}}
+    with path.open("r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _write_manifest(manifest: Dict[str, Any], path: Path) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+        fh.write("\n")
+    os.replace(tmp, path)
+
+
+def _discover_jobs(
+    title_ids: Iterable[str],
+    formats: Tuple[str, ...],
+    manifest: Dict[str, Any],
+    ffmpeg: str,
+    force: bool,
+    root: Path,
+) -> List[TranscodeJob]:
+    jobs: List[TranscodeJob] = []
+    for title_id in title_ids:
+        title_dir = root / title_id
+        if not title_dir.is_dir():
+            continue
+        cached_title = manifest["titles"].get(title_id, {})
+        for source in sorted(title_dir.glob("*/*.wav")):
+            if source.name == BUNDLE_NAME:
+                continue
+            relative = source.relative_to(title_dir).as_posix()
+            jobs.append(
+                TranscodeJob(
+                    title_id=title_id,
+                    relative=relative,
+                    source=str(source),
+                    formats=formats,
+                    cached=cached_title.get(relative, {}),
+                    ffmpeg=ffmpeg,
+                    force=force,
+                )
+            )
+    return jobs
+
+
+def transcode_catalog(
+    formats: Sequence[str] = tuple(RENDITION_FORMATS),
+    title_ids: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+    ffmpeg: str = "ffmpeg",
+    manifest_path: Path = RENDITIONS_PATH,
+) -> TranscodeReport:
+    """Encode every catalog WAV into ``formats`` in parallel and refresh the manifest.
+
+    Titles not selected by ``title_ids`` keep their existing manifest entries.
+    """
+
+    unknown = [name for name in formats if name not in RENDITION_FORMATS]
+    if unknown:
+        raise TranscodeError(f"Unknown rendition formats: {', '.join(unknown)}")
+    ffmpeg_path = shutil.which(ffmpeg)
+    if ffmpeg_path is None:
+        raise TranscodeError(f"ffmpeg not found ({ffmpeg}); install it or pass --ffmpeg")
+
+    catalog_titles = get_catalog_index().titles
+    selected = list(title_ids) if title_ids else list(catalog_titles)
+    missing = [title_id for title_id in selected if title_id not in catalog_titles]
+    if missing:
+        raise TranscodeError(f"Unknown titles: {', '.join(missing)}")
+
+    manifest = load_manifest(manifest_path)
+    jobs = _discover_jobs(selected, tuple(formats), manifest, ffmpeg_path, force, media_root())
+
+    report = TranscodeReport(rendition_bytes={name: 0 for name in formats})
+    fresh_titles: Dict[str, Dict[str, Any]] = {title_id: {} for title_id in selected}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for job, entry, encoded, error in pool.map(_run_job, jobs, chunksize=4):
+            if error is not None:
+                report.failed.append(f"{job.title_id}/{job.relative}: {error}")
+                if job.cached:
+                    fresh_titles[job.title_id][job.relative] = job.cached
+                continue
+            fresh_titles[job.title_id][job.relative] = entry
+            report.encoded += int(encoded)
+            report.cached += int(not encoded)
+            report.source_bytes += entry["bytes"]
+            for name in formats:
+                report.rendition_bytes[name] += entry[name]["bytes"]
+
+    titles = dict(manifest["titles"])
+    for title_id, segments in fresh_titles.items():
+        if segments:
+            titles[title_id] = segments
+        else:
+            titles.pop(title_id, None)
+    known = {**manifest.get("formats", {}), **{name: {} for name in formats}}
+    # Format order is the client's preference order (smallest first).
+    manifest = {
+        "formats": {
+            name: fmt.describe() for name, fmt in RENDITION_FORMATS.items() if name in known
+        },
+        "titles": {
+            title_id: dict(sorted(segments.items())) for title_id, segments in sorted(titles.items())
+        },
+    }
+    _write_manifest(manifest, manifest_path)
+    return report
@@ -0,0 +1,208 @@
+"""Full-text search over every sentence of the catalog, backed by a SQLite FTS5 file.
+
+``manage.py index-transcripts`` streams each ``<LANG>-<title>.json`` sentence
+list, one file at a time, into a fresh FTS5 table. The table uses the
+``unicode61 remove_diacritics 2`` tokenizer, so "casa color" finds
+"Lá càsa éra de colór vèrd". The new file is swapped in with a rename, and
+request handlers reopen it when they notice the swap. No JSON is read at query
+time.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .catalog import get_catalog_index, media_root
+from .settings import get_settings
+
+settings = get_settings()
+
+INDEX_VERSION = 1
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class TranscriptIndexError(RuntimeError):
+    """Raised when the transcript index is missing or cannot be built."""
+
+
+@dataclass(frozen=True)
+class IndexReport:
+    titles: int
+    languages: int
+    sentences: int
+    seconds: float
+    path: Path
+
+    def summary(self) -> str:
+        return (
+            f"indexed {self.sentences} sentences ({self.titles} titles, {self.languages} "
+            f"title languages) into {self.path} in {self.seconds:.2f}s"
+        )
+
+
+def index_path() -> Path:
+    return Path(settings.transcript_index_path)
+
+
+def _sentence_lists(title_dir: Path, title_id: str) -> List[Tuple[str, Path]]:
+    suffix = f"-{title_id}.json"
+    return [
+        (path.name[: -len(suffix)].upper(), path)
+        for path in sorted(title_dir.glob(f"*{suffix}"))
+    ]
+
+
+def build_transcript_index(
+    title_ids: Optional[Sequence[str]] = None, path: Optional[Path] = None
+) -> IndexReport:
+    """Rebuild the FTS5 index from the sentence lists of ``title_ids`` (default: all)."""
+
+    started = time.perf_counter()
+    target = path or index_path()
+    catalog_titles = get_catalog_index().titles
+    selected = list(title_ids) if title_ids else list(catalog_titles)
+    unknown = [title_id for title_id in selected if title_id not in catalog_titles]
+    if unknown:
+        raise TranscriptIndexError(f"Unknown titles: {', '.join(unknown)}")
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    titles = languages = sentences = 0
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(
+            "CREATE VIRTUAL TABLE sentences USING fts5("
+            "title_id UNINDEXED, lang UNINDEXED, n UNINDEXED, text, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("BEGIN")
+        root = media_root()
+        for title_id in selected:
+            title_dir = root / title_id
+            if not title_dir.is_dir():
+                continue
+            lists = _sentence_lists(title_dir, title_id)
+            titles += bool(lists)
+            for lang, list_path in lists:
+                try:
+                    with list_path.open("r", encoding="utf-8") as fh:
+                        entries = json.load(fh)
+                except (OSError, json.JSONDecodeError) as exc:
+                    raise TranscriptIndexError(f"{list_path.name}: {exc}") from exc
+                rows = [
+                    (title_id, lang, int(entry["n"]), entry["text"])
+                    for entry in entries
+                    if isinstance(entry, dict) and entry.get("text") and "n" in entry
+                ]
+                conn.executemany(
+                    "INSERT INTO sentences (title_id, lang, n, text) VALUES (?, ?, ?, ?)", rows
+                )
+                languages += 1
+                sentences += len(rows)
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("version", str(INDEX_VERSION)),
+                ("built_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+            ],
+        )
+        conn.execute("COMMIT")
+        conn.execute("INSERT INTO sentences (sentences) VALUES ('optimize')")
+    except BaseException:
+        conn.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    conn.close()
+    os.replace(tmp, target)
+    return IndexReport(titles, languages, sentences, time.perf_counter() - started, target)
+
+
+def match_expression(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word required, the last one as a prefix."""
+
+    words = _WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class TranscriptSearcher:
+    """Per-thread read-only connections that follow the index file across rebuilds."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError as exc:
+            raise TranscriptIndexError(
+                "Transcript index not built; run manage.py index-transcripts"
+            ) from exc
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        cached = getattr(self._local, "cached", None)
+        if cached is not None and cached[0] == identity:
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+        conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+        self._local.cached = (identity, conn)
+        return conn
+
+    def search(
+        self,
+        query: str,
+        title_ids: Optional[Sequence[str]] = None,
+        langs: Sequence[str] = (),
+        offset: int = 0,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """Best-ranked sentence hits; ``title_ids=None`` searches every title."""
+
+        expression = match_expression(query)
+        if expression is None or title_ids == []:
+            return {"total": 0, "items": []}
+        where = ["sentences MATCH ?"]
+        params: List[Any] = [expression]
+        if title_ids is not None:
+            where.append("title_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(title_ids)))
+        if langs:
+            where.append("lang IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([lang.upper() for lang in langs]))
+        clause = " AND ".join(where)
+        conn = self._connection()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM sentences WHERE {clause}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT title_id, lang, n, text FROM sentences WHERE {clause} "
+                "ORDER BY rank LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        except sqlite3.DatabaseError as exc:
+            raise TranscriptIndexError(f"Transcript index unreadable: {exc}") from exc
+        return {
+            "total": total,
+            "items": [
+                {"title_id": title_id, "lang": lang, "n": n, "text": text}
+                for title_id, lang, n, text in rows
+            ],
+        }
+
+
+transcript_searcher = TranscriptSearcher(index_path())
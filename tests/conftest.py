@@ -0,0 +1,40 @@
+"""Shared test setup: an isolated environment applied before ``backend`` is imported.
+
+Settings are read once per process, so the database, history file and secrets
+point at a temporary directory here; individual tests adjust the shared
+``Settings`` instance with ``monkeypatch``.
+"""
+import os
+import socket
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_TMP = tempfile.TemporaryDirectory(prefix="audiovook-tests-")
+_ROOT = Path(_TMP.name)
+
+os.environ.update(
+    JWT_SECRET_KEY="test-secret",
+    DATABASE_URL=f"sqlite:///{_ROOT / 'test.db'}",
+    EMAIL_ENABLED="false",
+    EMAIL_QUEUE_ENABLED="false",
+    PAYPAL_IPN_DEFERRED="false",
+    CATALOG_HISTORY_PATH=str(_ROOT / "catalog_history.json"),
+    RATE_LIMIT_SQLITE_PATH=str(_ROOT / "rate_limits.sqlite3"),
+    TRANSCRIPT_INDEX_PATH=str(_ROOT / "transcripts.sqlite3"),
+)
+
+
+@pytest.fixture
+def settings():
+    from backend.settings import get_settings
+
+    return get_settings()
+
+
+@pytest.fixture
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,25 @@
+from backend.catalog import _PayloadCache, get_catalog_index, get_package_payload
+from backend.payloads import encode_json_payload
+
+
+def test_payload_cache_evicts_least_recently_used():
+    cache = _PayloadCache(size=2)
+    payloads = {key: encode_json_payload({"key": key}) for key in "abc"}
+    cache.put("a", payloads["a"])
+    cache.put("b", payloads["b"])
+    assert cache.get("a") is payloads["a"]
+
+    cache.put("c", payloads["c"])
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is payloads["a"]
+    assert cache.get("c") is payloads["c"]
+
+
+def test_package_payload_is_cached_per_snapshot():
+    index = get_catalog_index()
+    package_id = next(iter(index.packages_by_id))
+
+    assert get_package_payload(package_id) is get_package_payload(package_id)
+    assert index.payloads.get(package_id) is get_package_payload(package_id)
@@ -0,0 +1,128 @@
+import pytest
+from aiosmtpd.controller import Controller
+
+from backend.email_utils import EmailOutbox
+
+LINK = "https://dual.local/auth/magic-login?token=abc"
+
+
+class RecordingHandler:
+    """Accepts every message after answering DATA with the queued ``replies`` first."""
+
+    def __init__(self, *replies: str) -> None:
+        self.replies = list(replies)
+        self.messages = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.add(session.peer)
+        if self.replies:
+            return self.replies.pop(0)
+        self.messages.append(envelope)
+        return "250 Message accepted"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch, settings, free_port):
+    controllers = []
+
+    def start(handler: RecordingHandler) -> Controller:
+        controller = Controller(handler, hostname="127.0.0.1", port=free_port)
+        controller.start()
+        controllers.append(controller)
+        monkeypatch.setattr(settings, "email_enabled", True)
+        monkeypatch.setattr(settings, "smtp_host", "127.0.0.1")
+        monkeypatch.setattr(settings, "smtp_port", free_port)
+        monkeypatch.setattr(settings, "smtp_use_tls", False)
+        monkeypatch.setattr(settings, "email_queue_enabled", True)
+        monkeypatch.setattr(settings, "email_queue_workers", 1)
+        monkeypatch.setattr(settings, "email_retry_backoff_seconds", 0.01)
+        return controller
+
+    yield start
+    for controller in controllers:
+        controller.stop()
+
+
+def _deliver(outbox: EmailOutbox, *recipients: str) -> None:
+    outbox.start()
+    for recipient in recipients:
+        assert outbox.enqueue_magic_link(recipient, LINK, "abc")
+    outbox.stop(timeout=10)
+
+
+def test_delivers_queued_messages_over_one_connection(smtp_server):
+    handler = RecordingHandler()
+    smtp_server(handler)
+    outbox = EmailOutbox()
+
+    _deliver(outbox, "a@example.com", "b@example.com", "c@example.com")
+
+    assert [envelope.rcpt_tos for envelope in handler.messages] == [
+        ["a@example.com"],
+        ["b@example.com"],
+        ["c@example.com"],
+    ]
+    assert LINK in handler.messages[0].content.decode()
+    assert len(handler.peers) == 1
+    metrics = outbox.metrics()
+    assert metrics["enqueued"] == 3
+    assert metrics["sent"] == 3
+    assert metrics["retried"] == metrics["failed"] == 0
+
+
+def test_retries_transient_rejection(smtp_server):
+    handler = RecordingHandler("451 4.3.0 Try again later")
+    smtp_server(handler)
+    outbox = EmailOutbox()
+
+    _deliver(outbox, "a@example.com")
+
+    assert len(handler.messages) == 1
+    assert len(handler.peers) == 1
+    metrics = outbox.metrics()
+    assert metrics["retried"] == 1
+    assert metrics["sent"] == 1
+
+
+def test_gives_up_after_max_attempts(smtp_server, monkeypatch, settings):
+    monkeypatch.setattr(settings, "email_max_attempts", 2)
+    handler = RecordingHandler("451 4.3.0 Try again later", "451 4.3.0 Try again later")
+    smtp_server(handler)
+    outbox = EmailOutbox()
+
+    _deliver(outbox, "a@example.com")
+
+    assert handler.messages == []
+    metrics = outbox.metrics()
+    assert metrics["retried"] == 1
+    assert metrics["failed"] == 1
+    assert metrics["sent"] == 0
+
+
+def test_permanent_rejection_is_not_retried(smtp_server):
+    handler = RecordingHandler("550 5.1.1 No such user")
+    smtp_server(handler)
+    outbox = EmailOutbox()
+
+    _deliver(outbox, "missing@example.com", "a@example.com")
+
+    assert [envelope.rcpt_tos for envelope in handler.messages] == [["a@example.com"]]
+    assert len(handler.peers) == 1
+    metrics = outbox.metrics()
+    assert metrics["retried"] == 0
+    assert metrics["failed"] == 1
+    assert metrics["sent"] == 1
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch, settings):
+    monkeypatch.setattr(settings, "email_queue_max_size", 1)
+    outbox = EmailOutbox()
+
+    assert outbox.enqueue_magic_link("a@example.com", LINK, "abc")
+    assert not outbox.enqueue_magic_link("b@example.com", LINK, "def")
+
+    metrics = outbox.metrics()
+    assert metrics["enqueued"] == 1
+    assert metrics["dropped"] == 1
+    assert metrics["queued"] == 1
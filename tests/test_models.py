@@ -0,0 +1,22 @@
+from backend.catalog import get_package_ids
+from backend.models import User, UserPackage
+
+
+def test_package_id_set_is_memoized_until_the_version_changes():
+    user = User(email="memo@example.com", full_access=False, package_links=[])
+    user.package_links.append(UserPackage(package_id="pkg-a1"))
+    first = user.package_id_set
+
+    assert first == {"pkg-a1"}
+    assert user.package_id_set is first
+
+    user.package_links.append(UserPackage(package_id="pkg-a2"))
+    user.bump_entitlement_version()
+
+    assert user.package_id_set == {"pkg-a1", "pkg-a2"}
+
+
+def test_full_access_shares_the_catalog_id_set():
+    user = User(email="all@example.com", full_access=True, package_links=[])
+
+    assert user.package_id_set is get_package_ids()
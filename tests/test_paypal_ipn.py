@@ -0,0 +1,164 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.database import SessionLocal
+from backend.models import PayPalNotification, User
+
+
+class VerifyEndpoint:
+    """Local stand-in for PayPal's ``cmd=_notify-validate`` endpoint."""
+
+    def __init__(self, port: int) -> None:
+        self.verdicts = []  # consumed first, then ``default``
+        self.default = "VERIFIED"
+        self.barrier = None  # answer only once this many requests are waiting
+        self.requests = []
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                endpoint.requests.append(body)
+                if endpoint.barrier is not None:
+                    endpoint.barrier.wait()
+                verdict = endpoint.verdicts.pop(0) if endpoint.verdicts else endpoint.default
+                code = 500 if verdict == "ERROR" else 200
+                self.send_response(code)
+                self.send_header("Content-Type", "text/plain")
+                self.end_headers()
+                self.wfile.write(verdict.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{port}/cgi-bin/webscr"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def verify_endpoint(monkeypatch, settings, free_port):
+    endpoint = VerifyEndpoint(free_port)
+    monkeypatch.setattr(settings, "paypal_ipn_verify_url", endpoint.url)
+    monkeypatch.setattr(settings, "paypal_ipn_retry_backoff_seconds", 0.05)
+    yield endpoint
+    endpoint.close()
+
+
+@pytest.fixture
+def deferred(monkeypatch, settings):
+    monkeypatch.setattr(settings, "paypal_ipn_deferred", True)
+    monkeypatch.setattr(settings, "paypal_ipn_workers", 2)
+
+
+def _ipn(email: str, txn_id: str, package: str = "pkg-a1", status: str = "Completed") -> bytes:
+    return urlencode(
+        {"payer_email": email, "payment_status": status, "custom": package, "txn_id": txn_id}
+    ).encode()
+
+
+def _notifications(*txn_ids: str):
+    with SessionLocal() as db:
+        rows = db.query(PayPalNotification).order_by(PayPalNotification.id).all()
+    return [
+        (row.status, row.dedupe_key, row.attempts)
+        for row in rows
+        if any(f"txn_id={txn_id}" in row.payload for txn_id in txn_ids)
+    ]
+
+
+def _wait_settled(*txn_ids: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        rows = _notifications(*txn_ids)
+        if rows and all(status not in ("pending", "processing") for status, _, _ in rows):
+            return rows
+        if time.monotonic() > deadline:
+            raise AssertionError(f"notifications not settled: {rows}")
+        time.sleep(0.05)
+
+
+def _packages(email: str):
+    with SessionLocal() as db:
+        user = db.query(User).filter_by(email=email).one_or_none()
+        return sorted(user.packages) if user else None
+
+
+def test_sync_verified_ipn_grants_once(verify_endpoint):
+    with TestClient(app) as client:
+        for _ in range(2):
+            response = client.post("/webhooks/paypal", content=_ipn("sync@example.com", "S1"))
+            assert response.json() == {"ok": True}
+
+    assert _packages("sync@example.com") == ["pkg-a1"]
+    assert _notifications("S1") == [("processed", "S1:completed", 1)]
+    assert verify_endpoint.requests[0].startswith(b"cmd=_notify-validate&")
+
+
+def test_sync_invalid_ipn_is_rejected(verify_endpoint):
+    verify_endpoint.default = "INVALID"
+    with TestClient(app) as client:
+        response = client.post("/webhooks/paypal", content=_ipn("forged@example.com", "S2"))
+
+    assert response.status_code == 400
+    assert _packages("forged@example.com") is None
+    assert _notifications("S2") == []
+
+
+def test_deferred_forged_ipn_does_not_block_the_real_one(verify_endpoint, deferred):
+    verify_endpoint.verdicts = ["INVALID"]
+    with TestClient(app) as client:
+        client.post("/webhooks/paypal", content=_ipn("d1@example.com", "D1"))
+        _wait_settled("D1")
+        client.post("/webhooks/paypal", content=_ipn("d1@example.com", "D1"))
+        rows = _wait_settled("D1")
+        # PayPal re-sending an applied txn is answered without storing it again.
+        client.post("/webhooks/paypal", content=_ipn("d1@example.com", "D1"))
+
+    assert rows == [("invalid", None, 1), ("processed", "D1:completed", 1)]
+    assert _notifications("D1") == rows
+    assert _packages("d1@example.com") == ["pkg-a1"]
+
+
+def test_deferred_retries_verification_errors(verify_endpoint, deferred):
+    verify_endpoint.verdicts = ["ERROR"]
+    with TestClient(app) as client:
+        client.post("/webhooks/paypal", content=_ipn("d2@example.com", "D2"))
+        rows = _wait_settled("D2")
+
+    assert rows == [("processed", "D2:completed", 2)]
+    assert _packages("d2@example.com") == ["pkg-a1"]
+
+
+def test_deferred_gives_up_after_max_attempts(verify_endpoint, deferred, monkeypatch, settings):
+    monkeypatch.setattr(settings, "paypal_ipn_max_attempts", 2)
+    verify_endpoint.default = "ERROR"
+    with TestClient(app) as client:
+        client.post("/webhooks/paypal", content=_ipn("d3@example.com", "D3"))
+        rows = _wait_settled("D3")
+
+    assert rows == [("failed", None, 2)]
+    assert _packages("d3@example.com") is None
+
+
+def test_deferred_concurrent_ipns_for_a_new_buyer(verify_endpoint, deferred):
+    # Both workers verify at once, then race to create the same user.
+    verify_endpoint.barrier = threading.Barrier(2, timeout=5)
+    with TestClient(app) as client:
+        client.post("/webhooks/paypal", content=_ipn("new@example.com", "C1", "pkg-a1"))
+        client.post("/webhooks/paypal", content=_ipn("new@example.com", "C2", "pkg-a2"))
+        rows = _wait_settled("C1", "C2")
+
+    assert rows == [("processed", "C1:completed", 1), ("processed", "C2:completed", 1)]
+    assert _packages("new@example.com") == ["pkg-a1", "pkg-a2"]